@@ -1,19 +1,47 @@
+import contextlib
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from src.nlp_recommender.api import router as nlp_router
 from src.prediction import router as prediction_router
 from src.nlp_recommender.report_generator import router as report_router
+from src.classification import router as classification_router
+from src.subsystems import WARM_ON_STARTUP, readiness, warm_all
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Heavy resources load in the background; the server accepts requests right away
+    if WARM_ON_STARTUP:
+        warm_all()
+    yield
 
 app = FastAPI(
     title="AI-Powered Threat Center",
     description="One-stop platform for threat classification, prediction, and mitigation recommendation",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Mount routes
 app.include_router(nlp_router, prefix="/nlp", tags=["NLP Recommendation"])
 app.include_router(prediction_router, prefix="/predict", tags=["Threat Prediction"])
 app.include_router(report_router, prefix="/report", tags=["Report Generation"])
+app.include_router(classification_router, tags=["Threat Classification"])
 
 @app.get("/")
 async def root():
-    return {"message": "Welcome to the AI-Powered Threat Center"}
\ No newline at end of file
+    return {"message": "Welcome to the AI-Powered Threat Center"}
+
+@app.get("/health/live", tags=["Health"])
+async def live():
+    """
+    Liveness: the worker is up and serving its event loop.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["Health"])
+async def ready():
+    """
+    Readiness: 200 once every subsystem is loaded, 503 with the state of each one until then.
+    """
+    is_ready, subsystems = readiness()
+    return JSONResponse({"ready": is_ready, "subsystems": subsystems}, status_code=200 if is_ready else 503)
@@ -0,0 +1,169 @@
+import os
+import time
+import argparse
+import threading
+import numpy as np
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.tree import DecisionTreeClassifier
+from src.model_training import MODEL_DIR, load_training_matrix, make_forest, save_model, split_indices
+from src.model_reduction import rank_features
+from src.model_registry import publish
+from src.transform import load_training_transform, promote_staged_transform
+
+# 📌 The cascade is saved as one artifact holding both stages
+CASCADE_PATH = os.path.join(MODEL_DIR, "threat_classifier_cascade.pkl")
+
+STAGE1_FEATURES = 8  # Most important forest features seen by the first stage
+STAGE1_DEPTH = 4  # Depth of the first-stage decision tree
+MAX_ACCURACY_DROP = 0.005  # Validation accuracy the cascade may lose against the forest alone
+VALIDATION_SIZE = 0.2  # Share of the training split held out to tune the exit threshold
+
+class CascadeClassifier:
+    """Two-stage classifier: a shallow tree answers confident flows, the forest the rest.
+
+    A flow exits at the first stage when the tree's top class probability reaches
+    `threshold`; every other flow is forwarded to the full forest. Exit counts are updated
+    under a lock, since the server scores batches from several threads at once.
+    """
+
+    def __init__(self, stage1, columns, forest, threshold):
+        self.stage1 = stage1
+        self.columns = np.asarray(columns)  # Feature positions read by the first stage
+        self.forest = forest
+        self.threshold = threshold
+        self.classes_ = forest.classes_
+        self.exits = np.zeros(2, dtype=np.int64)  # Flows answered by each stage
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _lock=threading.Lock())
+
+    def _count_exits(self, stage):
+        counts = np.bincount(stage, minlength=2)
+        with self._lock:
+            self.exits += counts
+
+    def reset_exits(self):
+        with self._lock:
+            self.exits[:] = 0
+
+    def _stage1(self, X):
+        proba = self.stage1.predict_proba(X[:, self.columns])
+        return proba, proba.max(axis=1) >= self.threshold
+
+    def predict_with_stage(self, X):
+        """Predictions plus the stage (0 = early exit, 1 = forest) that answered each flow."""
+        X = np.asarray(X, dtype=np.float32)
+        proba, confident = self._stage1(X)
+        y_pred = self.stage1.classes_[proba.argmax(axis=1)]
+        deferred = np.flatnonzero(~confident)
+        if len(deferred):
+            y_pred[deferred] = self.forest.predict(X[deferred])
+        stage = (~confident).astype(np.int8)
+        self._count_exits(stage)
+        return y_pred, stage
+
+    def predict(self, X):
+        return self.predict_with_stage(X)[0]
+
+    def predict_proba(self, X):
+        """First-stage probabilities for early exits, forest probabilities for the rest."""
+        X = np.asarray(X, dtype=np.float32)
+        proba, confident = self._stage1(X)
+        deferred = np.flatnonzero(~confident)
+        if len(deferred):
+            proba[deferred] = self.forest.predict_proba(X[deferred])
+        self._count_exits((~confident).astype(np.int8))
+        return proba
+
+    def exit_rates(self):
+        """Share of the flows seen so far that each stage answered."""
+        with self._lock:
+            exits = self.exits.copy()
+        total = max(int(exits.sum()), 1)
+        return {"stage1": exits[0] / total, "stage2": exits[1] / total, "flows": int(exits.sum())}
+
+def tune_threshold(confidence, stage1_pred, forest_pred, y, max_drop=MAX_ACCURACY_DROP):
+    """Lowest exit threshold (most early exits) keeping accuracy within `max_drop` of the forest."""
+    target = accuracy_score(y, forest_pred) - max_drop
+    for threshold in np.append(np.unique(confidence), np.inf):
+        accuracy = accuracy_score(y, np.where(confidence >= threshold, stage1_pred, forest_pred))
+        if accuracy >= target:
+            return float(threshold), accuracy
+    return np.inf, accuracy_score(y, forest_pred)  # Not reached: the last candidate is the forest alone
+
+def _throughput(predict, X):
+    """Flows per second for a single-threaded predict over `X`."""
+    start = time.perf_counter()
+    predict(X)
+    return len(X) / (time.perf_counter() - start)
+
+def train_cascade(n_jobs=-1, params=None, stage1_features=STAGE1_FEATURES, stage1_depth=STAGE1_DEPTH,
+                  max_drop=MAX_ACCURACY_DROP):
+    """Trains both stages, tunes the exit threshold on a validation split and saves the cascade."""
+    transform = load_training_transform()  # Read with the data, so it matches what the stages are fit on
+    X, y, features = load_training_matrix()
+    train_idx, test_idx = split_indices(y)
+    fit_idx, val_idx = train_test_split(train_idx, test_size=VALIDATION_SIZE, random_state=42, stratify=y[train_idx])
+    fit_idx.sort()
+    val_idx.sort()
+    X_fit, y_fit = X[fit_idx], y[fit_idx]
+    X_val, y_val = X[val_idx], y[val_idx]
+    X_test, y_test = X[test_idx], y[test_idx]
+
+    # 🔹 Stage 2 is the full forest; stage 1 a shallow tree over its most important features
+    print("Training the Random Forest Classifier (stage 2)...")
+    forest = make_forest(params, n_jobs).fit(X_fit, y_fit)
+    index = {name: i for i, name in enumerate(features)}
+    columns = [index[name] for name, _ in rank_features(forest, features)[:stage1_features]]
+    print(f"Training the stage 1 tree (depth {stage1_depth}) on {len(columns)} features...")
+    stage1 = DecisionTreeClassifier(max_depth=stage1_depth, class_weight="balanced", random_state=42)
+    stage1.fit(X_fit[:, columns], y_fit)
+
+    # 🔹 Tune the exit threshold on the validation split
+    proba = stage1.predict_proba(X_val[:, columns])
+    threshold, val_accuracy = tune_threshold(proba.max(axis=1), stage1.classes_[proba.argmax(axis=1)],
+                                             forest.predict(X_val), y_val, max_drop)
+    print(f"📌 Exit threshold {threshold:.4f} (validation accuracy {val_accuracy:.4f})")
+
+    # 🔹 Report accuracy, exit rates and throughput on the test split
+    forest.set_params(n_jobs=1)
+    cascade = CascadeClassifier(stage1, columns, forest, threshold)
+    y_pred, stage = cascade.predict_with_stage(X_test)
+    forest_rate = _throughput(forest.predict, X_test)
+    cascade_rate = _throughput(cascade.predict, X_test)
+    print(f"Forest accuracy: {accuracy_score(y_test, forest.predict(X_test)):.4f}")
+    print(f"Cascade accuracy: {accuracy_score(y_test, y_pred):.4f}")
+    print(f"📌 Exit rates: stage 1 {np.mean(stage == 0):.2%}, stage 2 {np.mean(stage == 1):.2%}")
+    print(f"📌 Throughput: forest {forest_rate:,.0f} flows/s, cascade {cascade_rate:,.0f} flows/s "
+          f"({cascade_rate / forest_rate:.2f}x)")
+
+    forest.set_params(n_jobs=n_jobs)
+    cascade.reset_exits()
+    save_model(cascade, CASCADE_PATH)
+    print(f"✅ Cascade saved to: {CASCADE_PATH}")
+    promote_staged_transform()
+    if transform is not None:
+        publish("cascade", transform)
+    else:
+        print("⚠️ No preprocessing transform found, the cascade was saved but not published for serving")
+    return cascade
+
+if __name__ == "__main__":
+    # Train through the package module so the pickled cascade does not reference __main__
+    from src import cascade
+
+    parser = argparse.ArgumentParser(description="Train the two-stage cascade threat classifier.")
+    parser.add_argument("--stage1-features", type=int, default=STAGE1_FEATURES, help="Features seen by stage 1")
+    parser.add_argument("--stage1-depth", type=int, default=STAGE1_DEPTH, help="Depth of the stage 1 tree")
+    parser.add_argument("--max-drop", type=float, default=MAX_ACCURACY_DROP, help="Accepted validation accuracy loss")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel jobs for training (-1 uses all cores)")
+    args = parser.parse_args()
+    cascade.train_cascade(args.n_jobs, stage1_features=args.stage1_features, stage1_depth=args.stage1_depth,
+                  max_drop=args.max_drop)
@@ -0,0 +1,444 @@
+import io
+import os
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from src.model_registry import RELOAD_INTERVAL, ModelRegistry, load_version
+from src.subsystems import LazyResource
+from src.window_features import HostWindowState
+
+# 📌 Serving configuration (overridable through the environment)
+MODEL_KIND = os.environ.get("THREAT_MODEL", "forest")  # forest, engine, cascade or reduced
+MAX_BATCH_SIZE = int(os.environ.get("CLASSIFY_MAX_BATCH_SIZE", 256))  # Flows per predict_proba call
+MAX_WAIT_MS = float(os.environ.get("CLASSIFY_MAX_WAIT_MS", 2.0))  # Time a batch waits to fill up
+BULK_CHUNK_ROWS = int(os.environ.get("CLASSIFY_BULK_CHUNK_ROWS", 10_000))  # Flows scored at a time by /classify/bulk
+
+NDJSON_TYPE = "application/x-ndjson"
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+CONTINUATION = b"\xff\xff\xff\xff"  # Arrow IPC marker before each message's metadata length
+
+class MicroBatcher:
+    """Coalesces concurrent requests into batched `predict_proba` calls.
+
+    Requests are queued; the batching task takes the first waiting request and keeps
+    collecting until the batch holds `max_batch_size` flows or `max_wait_ms` has passed,
+    then scores the whole batch in one call on a worker thread and hands each request its
+    rows. A single request larger than the batch size is scored on its own. Requests carry
+    the `predict_proba` of the model version that transformed them, so a batch spanning a
+    model swap is scored per version.
+    """
+
+    def __init__(self, predict_proba, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.predict_proba = predict_proba
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)  # Batches are scored one at a time
+        self.stats = {"requests": 0, "flows": 0, "batches": 0}
+        self._getter = None
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, X, predict_proba=None):
+        """Queues a feature matrix and waits for its class probabilities."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((X, future, predict_proba or self.predict_proba))
+        return await future
+
+    async def _next(self, timeout=None):
+        # The pending get survives a timeout, so no request is lost between batches
+        if self._getter is None:
+            self._getter = asyncio.ensure_future(self.queue.get())
+        done, _ = await asyncio.wait({self._getter}, timeout=timeout)
+        if not done:
+            return None
+        item, self._getter = self._getter.result(), None
+        return item
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._next()]
+            rows = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while rows < self.max_batch_size:
+                item = await self._next(timeout=max(deadline - loop.time(), 0))
+                if item is None:
+                    break
+                batch.append(item)
+                rows += len(item[0])
+
+            groups = {}
+            for item in batch:
+                groups.setdefault(item[2], []).append(item)
+            for predict_proba, items in groups.items():
+                await self._score(loop, predict_proba, items)
+            self.stats["requests"] += len(batch)
+            self.stats["flows"] += rows
+            self.stats["batches"] += 1
+
+    async def _score(self, loop, predict_proba, items):
+        X = np.concatenate([x for x, _, _ in items]) if len(items) > 1 else items[0][0]
+        try:
+            proba = await loop.run_in_executor(self.executor, predict_proba, X)
+        except Exception as e:
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        offset = 0
+        for x, future, _ in items:
+            if not future.done():  # The client may have gone away
+                future.set_result(proba[offset:offset + len(x)])
+            offset += len(x)
+
+class ClassifyRequest(BaseModel):
+    flows: List[Dict[str, Any]]  # Raw flows, keyed by CICFlowMeter column name
+
+# 📌 The model is loaded in the background after startup; requests get 503 until it is ready
+service = {}
+
+def _load_registry():
+    registry = ModelRegistry(MODEL_KIND)
+    registry.load_initial()
+    return registry
+
+classifier = LazyResource("classifier", _load_registry)
+
+async def _load_and_serve():
+    """Loads the classifier off the event loop, then starts batching and hot reload (once)."""
+    registry = await run_in_threadpool(classifier.get)
+    if "registry" in service:
+        return
+    batcher = MicroBatcher(registry.current.predict_proba)
+    batcher.start()
+    watcher = asyncio.get_running_loop().create_task(registry.watch())
+    service.update(registry=registry, batcher=batcher, watcher=watcher, hosts=HostWindowState())
+
+async def _start_serving():
+    """Keeps retrying a failed load (e.g. artifacts not trained yet) until the classifier is served."""
+    while "registry" not in service:
+        try:
+            await _load_and_serve()
+        except Exception:
+            print(f"⚠️ Classifier failed to load: {classifier.error}, retrying in {RELOAD_INTERVAL:g}s")
+            await asyncio.sleep(RELOAD_INTERVAL)
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    starter = asyncio.get_running_loop().create_task(_start_serving())
+    yield
+    for task in (starter, service.get("watcher")):
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+    if "batcher" in service:
+        await service["batcher"].stop()
+    service.clear()
+
+router = APIRouter(lifespan=lifespan)
+
+def _current():
+    if "registry" not in service:
+        raise HTTPException(status_code=503, detail=f"Classifier is {classifier.state}")
+    return service["registry"].current
+
+@router.post("/classify")
+async def classify(request: ClassifyRequest):
+    """
+    Classifies raw flows; concurrent requests are scored together in micro-batches.
+    """
+    current = _current()  # The whole request uses one model version
+    if not request.flows:
+        return {"predictions": []}
+
+    # Per-host aggregates include the earlier flows of each host. The pandas work runs on a
+    # worker thread, so concurrent requests transform in parallel and the loop only queues
+    X = await run_in_threadpool(current.transform.transform, pd.DataFrame(request.flows), service["hosts"])
+    proba = await service["batcher"].submit(X, current.predict_proba)
+
+    classes = current.classes
+    best = proba.argmax(axis=1)
+    return {"predictions": [
+        {
+            "label": classes[i],
+            "confidence": float(row[i]),
+            "probabilities": {str(c): float(p) for c, p in zip(classes, row)},
+        }
+        for i, row in zip(best, proba)
+    ]}
+
+@router.get("/classify/stats")
+async def classify_stats():
+    """
+    Requests, flows and batches scored since startup, plus cascade exit rates.
+    """
+    current = _current()
+    stats = dict(service["batcher"].stats, model=MODEL_KIND, version=current.version)
+    stats["mean_batch_flows"] = stats["flows"] / max(stats["batches"], 1)
+    if hasattr(current.model, "exit_rates"):
+        stats["exit_rates"] = current.model.exit_rates()
+    return stats
+
+@router.get("/classify/status")
+async def classify_status():
+    """
+    Served and previous model versions, reload count and the last reload error.
+    """
+    _current()
+    return service["registry"].status()
+
+@router.post("/classify/reload")
+async def classify_reload():
+    """
+    Loads, warms up and swaps in the published version now, instead of at the next poll.
+    """
+    if "registry" not in service:  # Nothing served yet: retry the initial load now
+        try:
+            await _load_and_serve()
+        except Exception:
+            raise HTTPException(status_code=503, detail=f"Classifier is {classifier.state}: {classifier.error}")
+        return dict(service["registry"].status(), swapped=True)
+    swapped = await service["registry"].reload()
+    return dict(service["registry"].status(), swapped=swapped)
+
+@router.post("/classify/rollback")
+async def classify_rollback():
+    """
+    Swaps the previous model version back in.
+    """
+    _current()
+    try:
+        service["registry"].rollback()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return service["registry"].status()
+
+# 📌 Bulk scoring: bodies are decoded incrementally and results streamed back per chunk
+class ArrowStreamDecoder:
+    """Decodes an Arrow IPC stream from arbitrary byte pieces, yielding complete record batches."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.schema = None
+        self.finished = False
+
+    def _message_size(self):
+        """Size of the first complete message in the buffer, None if incomplete, 0 at end of stream.
+
+        A message starts with a continuation marker (absent in the legacy format) and the
+        metadata length, so completeness of the metadata is known from the prefix. Its body
+        length is only known from the metadata, which pyarrow reports with an OSError.
+        """
+        prefix = 8 if self.buffer[:4] == CONTINUATION else 4
+        if len(self.buffer) < prefix:
+            return None
+        length = int.from_bytes(self.buffer[prefix - 4:prefix], "little")
+        if length == 0:
+            return 0
+        if len(self.buffer) < prefix + length:
+            return None
+        reader = pa.BufferReader(pa.py_buffer(self.buffer))
+        try:
+            pa.ipc.read_message(reader)
+        except OSError:  # Body not fully received yet
+            return None
+        return reader.tell()
+
+    def feed(self, data):
+        self.buffer += data
+        batches = []
+        while self.buffer and not self.finished:
+            size = self._message_size()
+            if size is None:
+                break
+            if size == 0:
+                self.finished = True
+                break
+            frame = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            message = pa.ipc.read_message(pa.BufferReader(frame))
+            if self.schema is None:
+                self.schema = pa.ipc.read_schema(message)
+            else:
+                batches.append(pa.ipc.read_record_batch(message, self.schema))
+        return batches
+
+    def close(self):
+        if self.buffer and not self.finished:
+            raise ValueError("Arrow stream ended in the middle of a message")
+
+async def _iter_ndjson_frames(body, chunk_rows):
+    """Yields DataFrames of up to `chunk_rows` flows from an NDJSON byte stream."""
+    pending, records = b"", []
+    async for data in body:
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        records += [json.loads(line) for line in lines if line.strip()]
+        while len(records) >= chunk_rows:
+            yield pd.DataFrame.from_records(records[:chunk_rows])
+            records = records[chunk_rows:]
+    if pending.strip():
+        records.append(json.loads(pending))
+    if records:
+        yield pd.DataFrame.from_records(records)
+
+async def _iter_arrow_frames(body, chunk_rows):
+    """Yields DataFrames of up to `chunk_rows` flows from an Arrow IPC stream."""
+    decoder, batches, rows = ArrowStreamDecoder(), [], 0
+    async for data in body:
+        for batch in decoder.feed(data):
+            batches.append(batch)
+            rows += batch.num_rows
+        if rows >= chunk_rows:
+            table = pa.Table.from_batches(batches, schema=decoder.schema)
+            full = rows - rows % chunk_rows
+            for start in range(0, full, chunk_rows):
+                yield table.slice(start, chunk_rows).to_pandas()
+            batches, rows = table.slice(full).to_batches(), rows - full
+    decoder.close()
+    if rows:
+        yield pa.Table.from_batches(batches, schema=decoder.schema).to_pandas()
+
+class DuplexStreamingResponse(StreamingResponse):
+    """A StreamingResponse that can start while the request body is still being read.
+
+    StreamingResponse normally listens for disconnects on `receive`, which would swallow
+    the body messages the generator is consuming; here the body stream reports disconnects.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+def _score_frame(current, frame, hosts):
+    proba = current.predict_proba(current.transform.transform(frame, hosts))
+    best = proba.argmax(axis=1)
+    return np.asarray(current.classes)[best], proba[np.arange(len(best)), best]
+
+async def _stream_scores(frames, current, arrow):
+    """Scores each decoded chunk off the event loop and yields the encoded results."""
+    sink, writer, offset = io.BytesIO(), None, 0
+    hosts = HostWindowState()  # An upload is its own flow stream, aggregated across its chunks
+    async for frame in frames:
+        labels, confidence = await run_in_threadpool(_score_frame, current, frame, hosts)
+        rows = np.arange(offset, offset + len(frame))
+        offset += len(frame)
+        if not arrow:
+            yield "".join(json.dumps({"row": int(r), "label": label, "confidence": float(c)}) + "\n"
+                          for r, label, c in zip(rows, labels.tolist(), confidence)).encode()
+            continue
+
+        batch = pa.record_batch({"row": rows, "label": labels, "confidence": confidence.astype(np.float64)})
+        if writer is None:
+            writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), batch.schema)
+        writer.write_batch(batch)
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    if writer is not None:
+        writer.close()
+        yield sink.getvalue()
+
+@router.post("/classify/bulk")
+async def classify_bulk(request: Request):
+    """
+    Scores a streamed NDJSON or Arrow IPC body of raw flows chunk by chunk, streaming
+    predictions back in the same format as soon as each chunk is scored.
+    """
+    current = _current()  # The whole upload is scored by one model version
+    content_type = request.headers.get("content-type", NDJSON_TYPE).split(";")[0].strip()
+    if content_type not in (NDJSON_TYPE, ARROW_STREAM_TYPE):
+        raise HTTPException(status_code=415, detail=f"Send {NDJSON_TYPE} or {ARROW_STREAM_TYPE}")
+
+    arrow = content_type == ARROW_STREAM_TYPE
+    frames = (_iter_arrow_frames if arrow else _iter_ndjson_frames)(request.stream(), BULK_CHUNK_ROWS)
+    scores = _stream_scores(frames, current, arrow)
+    return DuplexStreamingResponse(scores, media_type=content_type)
+
+def _check_arrow_decoder(rows=20_000, piece_sizes=(1, 7, 1000, 65536)):
+    """Feeds an Arrow stream to the decoder in small pieces and checks every row comes back."""
+    table = pa.table({"Src IP": [f"10.0.0.{i % 255}" for i in range(rows)], "Flow Duration": np.arange(rows)})
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=rows // 4):
+            writer.write_batch(batch)
+    data = sink.getvalue()
+    for size in piece_sizes:
+        decoder, batches = ArrowStreamDecoder(), []
+        for start in range(0, len(data), size):
+            batches += decoder.feed(data[start:start + size])
+        decoder.close()
+        assert decoder.finished and pa.Table.from_batches(batches).equals(table), f"{size}-byte pieces"
+    print(f"✅ Arrow decoder: {len(data):,} bytes decoded from pieces of {', '.join(map(str, piece_sizes))} bytes")
+
+async def _load_test(model, requests, concurrency, max_batch_size, max_wait_ms):
+    """Scores single-flow requests from `concurrency` clients through a batcher; returns latencies."""
+    batcher = MicroBatcher(model.predict_proba, max_batch_size, max_wait_ms)
+    batcher.start()
+    latencies = []
+
+    async def client(rows):
+        for X in rows:
+            start = time.perf_counter()
+            await batcher.submit(X)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(client(requests[i::concurrency]) for i in range(concurrency)))
+    await batcher.stop()
+    return latencies, batcher.stats
+
+if __name__ == "__main__":
+    from src import data_preprocessing
+
+    parser = argparse.ArgumentParser(description="Compare micro-batched and per-request classification.")
+    parser.add_argument("--model", default=MODEL_KIND, help="forest, engine, cascade or reduced")
+    parser.add_argument("--requests", type=int, default=2000, help="Single-flow requests to score")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--check-decoder", action="store_true", help="Only check the bulk Arrow stream decoder")
+    args = parser.parse_args()
+    if args.check_decoder:
+        _check_arrow_decoder()
+        raise SystemExit
+
+    model = load_version(args.model)
+    flows = pd.read_csv(data_preprocessing.input_file, dtype=str, nrows=args.requests, low_memory=False)
+    X = model.transform.transform(flows)
+    requests = [X[i:i + 1] for i in range(len(X))]
+
+    start = time.perf_counter()
+    for x in requests:
+        model.predict_proba(x)
+    sequential = len(requests) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    latencies, stats = asyncio.run(_load_test(model, requests, args.concurrency, args.max_batch_size, args.max_wait_ms))
+    batched = len(requests) / (time.perf_counter() - start)
+
+    print(f"📌 Per-request predict: {sequential:,.0f} flows/s")
+    print(f"📌 Micro-batched: {batched:,.0f} flows/s ({batched / sequential:.1f}x), "
+          f"{stats['flows'] / stats['batches']:.1f} flows per batch, "
+          f"latency p50 {np.percentile(latencies, 50) * 1000:.1f} ms, p99 {np.percentile(latencies, 99) * 1000:.1f} ms")
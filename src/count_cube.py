@@ -0,0 +1,231 @@
+import os
+import glob
+import json
+import time
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from src.ingestion import TIMESTAMP_FORMAT
+
+# 📌 Attack counts per time bucket and label, kept up to date from the merged dataset
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "../processed_data")
+SOURCE = os.path.join(DATA_FOLDER, "merged_dataset.csv")  # Merged CSV, or a day-partitioned folder from ingestion
+CUBE_PATH = os.path.join(DATA_FOLDER, "attack_counts.parquet")
+
+BUCKET_FREQ = "h"  # Finest time bucket stored; coarser series are summed from it
+CSV_BLOCK_BYTES = 64 << 20  # CSV bytes parsed at a time
+BATCH_ROWS = 1_000_000  # Parquet rows read at a time
+CUBE_VERSION = 1  # Bump whenever the stored layout or its meaning changes
+
+def _bucket_counts(timestamps, labels, freq):
+    """Flows per (bucket, label) in one chunk; rows with an unparseable timestamp or no label are dropped.
+
+    Flow timestamps repeat heavily, so each distinct value is parsed only once.
+    """
+    codes, uniques = pd.factorize(timestamps)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.to_datetime(uniques, format=TIMESTAMP_FORMAT, errors="coerce")
+    failed = parsed.isna()
+    if failed.any():  # Not CICFlowMeter's format, e.g. ISO timestamps
+        parsed[failed] = pd.to_datetime(uniques[failed], errors="coerce")
+    buckets = np.append(parsed.dt.floor(freq).to_numpy(), np.datetime64("NaT"))  # codes of -1 map to NaT
+    frame = pd.DataFrame({"bucket": buckets[codes], "label": np.asarray(labels, dtype=object)})
+    return frame.value_counts()
+
+class CountCube:
+    """Flow counts per time bucket × label, built in one streaming pass and updated incrementally.
+
+    Only the Timestamp and Label columns of the source are read. A merged CSV is tracked by
+    the byte offset of the last complete line counted; a partition folder by the part files
+    already counted. `update` reads just what came after, so appending a capture costs a
+    pass over the new rows only. If counted data was rewritten instead of appended, the
+    cube is rebuilt from scratch.
+    """
+
+    def __init__(self, source=SOURCE, freq=BUCKET_FREQ):
+        self.source = os.path.abspath(source)
+        self.freq = freq
+        self.counts = pd.Series(dtype="int64", index=pd.MultiIndex.from_arrays(
+            [pd.DatetimeIndex([]), pd.Index([], dtype=object)], names=["bucket", "label"]))
+        self.watermark = None
+        self.rows = 0
+        self.updated_at = None
+
+    # 🔹 Persistence: counts and watermark are written together, atomically
+    def save(self, path=CUBE_PATH):
+        table = pa.Table.from_pandas(self.counts.rename("count").reset_index(), preserve_index=False)
+        meta = {"version": CUBE_VERSION, "source": self.source, "freq": self.freq,
+                "watermark": self.watermark, "rows": self.rows, "updated_at": self.updated_at}
+        table = table.replace_schema_metadata({b"count_cube": json.dumps(meta).encode()})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        return path
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        table = pq.read_table(path)
+        meta = json.loads(table.schema.metadata[b"count_cube"])
+        if meta["version"] != CUBE_VERSION:
+            raise ValueError(f"❌ Count cube version {meta['version']} is not {CUBE_VERSION}, rebuild it")
+        cube = cls(meta["source"], meta["freq"])
+        frame = table.to_pandas()
+        cube.counts = frame.set_index(["bucket", "label"])["count"].astype("int64")
+        cube.watermark, cube.rows, cube.updated_at = meta["watermark"], meta["rows"], meta["updated_at"]
+        return cube
+
+    # 🔹 Incremental reading of the source
+    def _csv_chunks(self):
+        """Yields (timestamps, labels, watermark) for the complete CSV lines past the watermark."""
+        state = self.watermark or {}
+        with open(self.source, "rb") as f:
+            header = f.readline()
+            if state and (state["header"] != header.decode() or not self._tail_matches(f, state)):
+                raise _Rewritten()
+            names = pacsv.read_csv(pa.py_buffer(header)).column_names
+            if "Timestamp" not in names or "Label" not in names:
+                raise ValueError("Dataset must contain 'Timestamp' and 'Label' columns.")
+
+            offset = state.get("offset", len(header))
+            f.seek(offset)
+            pending = b""
+            while True:
+                block = f.read(CSV_BLOCK_BYTES)
+                if not block:
+                    break
+                data = pending + block
+                end = data.rfind(b"\n") + 1  # An unterminated last line is left for the next update
+                pending = data[end:]
+                if not end:
+                    continue
+                table = pacsv.read_csv(
+                    pa.py_buffer(data[:end]),
+                    read_options=pacsv.ReadOptions(column_names=names),
+                    convert_options=pacsv.ConvertOptions(include_columns=["Timestamp", "Label"],
+                                                         column_types={"Timestamp": pa.string(), "Label": pa.string()}))
+                offset += end
+                yield (table.column("Timestamp").to_numpy(zero_copy_only=False),
+                       table.column("Label").to_numpy(zero_copy_only=False),
+                       {"header": header.decode(), "offset": offset, "tail": data[max(end - 64, 0):end].hex()})
+
+    @staticmethod
+    def _tail_matches(f, state):
+        """Whether the bytes before the watermark are still the ones counted, i.e. the file was only appended to."""
+        tail = bytes.fromhex(state["tail"])
+        f.seek(state["offset"] - len(tail))
+        matches = f.read(len(tail)) == tail
+        f.seek(0)
+        f.readline()
+        return matches
+
+    def _partition_chunks(self):
+        """Yields (timestamps, labels, watermark) for the part files not counted yet."""
+        done = dict((self.watermark or {}).get("parts", {}))
+        parts = {os.path.relpath(path, self.source): path
+                 for path in sorted(glob.glob(os.path.join(self.source, "day=*", "*.parquet")))}
+        for name, stamp in done.items():
+            path = parts.get(name)
+            if path is None or [os.stat(path).st_size, os.stat(path).st_mtime_ns] != stamp:
+                raise _Rewritten()
+        for name, path in parts.items():
+            if name in done:
+                continue
+            stamp = [os.stat(path).st_size, os.stat(path).st_mtime_ns]
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=BATCH_ROWS, columns=["Timestamp", "Label"]):
+                yield (batch.column("Timestamp").to_numpy(zero_copy_only=False),
+                       batch.column("Label").to_numpy(zero_copy_only=False), {"parts": dict(done)})
+            done[name] = stamp
+            yield np.empty(0, dtype=object), np.empty(0, dtype=object), {"parts": dict(done)}
+
+    def update(self):
+        """Counts the rows appended to the source since the last update; returns how many were read."""
+        chunks = self._partition_chunks() if os.path.isdir(self.source) else self._csv_chunks()
+        added, new = 0, []
+        for timestamps, labels, watermark in chunks:
+            new.append(_bucket_counts(timestamps, labels, self.freq))
+            added += len(timestamps)
+            self.watermark = watermark
+        if new:
+            merged = pd.concat([self.counts, *new]).groupby(level=["bucket", "label"]).sum()
+            self.counts = merged.astype("int64").sort_index()
+        self.rows += added
+        self.updated_at = datetime.datetime.now().isoformat()
+        return added
+
+    # 🔹 Queries
+    @property
+    def labels(self):
+        return sorted(self.counts.index.get_level_values("label").unique())
+
+    def _check_freq(self, freq):
+        start = pd.Timestamp(0)
+        if start + pd.tseries.frequencies.to_offset(freq) < start + pd.tseries.frequencies.to_offset(self.freq):
+            raise ValueError(f"❌ Cube buckets are '{self.freq}', '{freq}' counts need a finer BUCKET_FREQ")
+
+    def series(self, label=None, freq="D"):
+        """Flows per `freq` bucket for one label (all labels if None), as a Prophet (ds, y) frame.
+
+        Only buckets with at least one flow are included.
+        """
+        self._check_freq(freq)
+        counts = self.counts if label is None else self.counts.xs(label, level="label", drop_level=False)
+        buckets = counts.index.get_level_values("bucket").floor(freq)
+        series = counts.groupby(buckets).sum()
+        return series[series > 0].rename_axis("ds").rename("y").reset_index()
+
+    def matrix(self, freq=None):
+        """Dense bucket × label matrix of counts over the full time range, missing buckets as zero."""
+        freq = freq or self.freq
+        self._check_freq(freq)
+        counts = self.counts.groupby([self.counts.index.get_level_values("bucket").floor(freq),
+                                      self.counts.index.get_level_values("label")]).sum()
+        wide = counts.unstack("label", fill_value=0)
+        if wide.empty:
+            return wide
+        index = pd.date_range(wide.index.min(), wide.index.max(), freq=freq, name="ds")
+        return wide.reindex(index, fill_value=0).astype("int64")
+
+class _Rewritten(Exception):
+    """Counted source data changed in place, so the counts can no longer be extended."""
+
+def update_cube(source=SOURCE, path=CUBE_PATH, freq=BUCKET_FREQ, rebuild=False):
+    """Brings the persisted cube up to date with `source`, building it on the first run."""
+    start = time.perf_counter()
+    cube = None
+    if not rebuild and os.path.exists(path):
+        try:
+            cube = CountCube.load(path)
+        except ValueError as e:
+            print(f"⚠️ {e}")
+        if cube is not None and (cube.source != os.path.abspath(source) or cube.freq != freq):
+            print(f"⚠️ Cube was built from {cube.source} at '{cube.freq}' buckets, rebuilding")
+            cube = None
+
+    if cube is not None:
+        try:
+            added = cube.update()
+        except _Rewritten:
+            print("⚠️ Counted rows of the source were rewritten, rebuilding the cube")
+            cube = None
+    if cube is None:
+        print(f"📌 Building the attack count cube from {source}")
+        cube = CountCube(source, freq)
+        added = cube.update()
+
+    if added or not os.path.exists(path):
+        cube.save(path)
+    print(f"✅ Count cube: {added} new rows counted in {time.perf_counter() - start:.2f}s, "
+          f"{len(cube.counts)} cells over {len(cube.labels)} labels ({cube.rows} rows in total)")
+    return cube
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the time bucket × label attack count cube.")
+    parser.add_argument("--source", default=SOURCE, help="Merged CSV or day-partitioned folder")
+    parser.add_argument("--freq", default=BUCKET_FREQ, help="Time bucket (pandas frequency, e.g. h, min, D)")
+    parser.add_argument("--rebuild", action="store_true", help="Recount the whole source")
+    args = parser.parse_args()
+    update_cube(args.source, freq=args.freq, rebuild=args.rebuild)
@@ -1,61 +1,228 @@
 import os
+import argparse
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler, LabelEncoder
+from src.storage import TableWriter, write_table
+from src.transform import PreprocessingTransform
+from src.ingestion import iter_partitions
 
 # 📌 Define file paths
 DATA_FOLDER = os.path.join(os.path.dirname(__file__), "../processed_data")
 OUTPUT_FOLDER = os.path.join(os.path.dirname(__file__), "../processed_data")
 
 input_file = os.path.join(DATA_FOLDER, "merged_dataset.csv")  # Use merged dataset
-output_file = os.path.join(OUTPUT_FOLDER, "cleaned_dataset.csv")  # Save location
+output_file = os.path.join(OUTPUT_FOLDER, "cleaned_dataset.parquet")  # Save location
+
+CHUNK_SIZE = 500_000  # Rows per chunk in streaming mode
+SCHEMA_SAMPLE_ROWS = 100_000  # Rows sampled for dtype inference
+CATEGORY_MAX_UNIQUE_RATIO = 0.05  # Strings with fewer distinct values than this are categorical
+
+def _narrowest_int(values):
+    """Returns the smallest signed integer dtype that holds every value."""
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if values.min() >= info.min and values.max() <= info.max:
+            return dtype
+    return np.int64
+
+def infer_schema(path=None, sample_rows=SCHEMA_SAMPLE_ROWS):
+    """Samples the file once and picks the narrowest dtype for each column."""
+    sample = pd.read_csv(path or input_file, dtype=str, nrows=sample_rows, low_memory=False)
+
+    schema = {}
+    for col in sample.columns:
+        values = sample[col].dropna()
+        numeric = pd.to_numeric(values, errors="coerce")
+        if numeric.notna().all():
+            # Integer columns with gaps cannot be parsed as NumPy ints, so they stay float.
+            # Ints are parsed at full width because read_csv silently wraps values that
+            # overflow a narrower dtype; they are downcast once the full range is known.
+            if len(values) and len(values) == len(sample) and pd.api.types.is_integer_dtype(numeric):
+                schema[col] = np.int64
+            else:
+                schema[col] = np.float32
+        elif values.nunique() <= max(1, len(values) * CATEGORY_MAX_UNIQUE_RATIO):
+            schema[col] = "category"  # Label-like strings (e.g. Label, Protocol names)
+        else:
+            schema[col] = str
+    return schema
+
+def _load_as_strings():
+    """Loads every column as a string and converts numeric columns one at a time."""
+    df = pd.read_csv(input_file, dtype=str, low_memory=False)
+    for col in df.columns:
+        try:
+            df[col] = pd.to_numeric(df[col])  # Convert to numeric type if possible
+        except ValueError:
+            pass  # Keep as string if conversion fails
+    return df
+
+def load_and_preprocess_data(transform=None):
+    """Loads and preprocesses the merged dataset.
 
-def load_and_preprocess_data():
-    """Loads and preprocesses the merged dataset."""
+    If a `PreprocessingTransform` is given, the fitted scaler and encoders are recorded on it.
+    """
     
     # 🔹 Load the dataset
     if not os.path.exists(input_file):
         raise FileNotFoundError(f"❌ File not found: {input_file}")
     
     print(f"📌 Loading dataset: {input_file}")
-    df = pd.read_csv(input_file, dtype=str, low_memory=False)
+
+    # 🔹 Parse every column straight into its inferred dtype
+    schema = infer_schema()
+    try:
+        df = pd.read_csv(input_file, dtype=schema, low_memory=False)
+    except (ValueError, OverflowError) as e:
+        # The sample did not cover the full value range of some column
+        print(f"⚠️ Inferred schema does not fit the full file ({e}), falling back to string parsing")
+        df = _load_as_strings()
+
+    # 🔹 Downcast integer columns to the narrowest dtype holding their full range
+    for col in df.select_dtypes(include="integer").columns:
+        df[col] = df[col].astype(_narrowest_int(df[col]))
 
     # 🔹 Handle missing values using forward fill
     df.ffill(inplace=True)
 
-    # 🔹 Convert numeric columns back to proper types
-    for col in df.columns:
-        try:
-            df[col] = pd.to_numeric(df[col])  # Convert to numeric type if possible
-        except ValueError:
-            pass  # Keep as string if conversion fails
-
     # 🔹 Normalize numerical columns
-    num_cols = df.select_dtypes(include=['int64', 'float64']).columns
+    num_cols = df.select_dtypes(include="number").columns
+    scaler = StandardScaler()
     if len(num_cols) > 0:
-        scaler = StandardScaler()
-        df[num_cols] = scaler.fit_transform(df[num_cols])
+        df[num_cols] = scaler.fit_transform(df[num_cols]).astype(np.float32)
 
     # 🔹 Encode categorical columns
-    cat_cols = df.select_dtypes(include=['object']).columns
+    cat_cols = df.select_dtypes(exclude="number").columns
     encoder = LabelEncoder()
+    categories = {}
     for col in cat_cols:
-        df[col] = df[col].astype(str)  # Convert everything to string before encoding
-        df[col] = encoder.fit_transform(df[col])
-
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Same codes as LabelEncoder: sorted categories, missing values encoded as "nan"
+            values = df[col]
+            if values.isna().any():
+                values = values.cat.add_categories(["nan"]).fillna("nan")
+            categories[col] = sorted(values.cat.categories)
+            df[col] = values.cat.reorder_categories(categories[col]).cat.codes
+        else:
+            df[col] = df[col].astype(str)  # Convert everything to string before encoding
+            df[col] = encoder.fit_transform(df[col])
+            df[col] = df[col].astype(_narrowest_int(df[col]))
+            categories[col] = list(encoder.classes_)
+
+    if transform is not None:
+        transform.set_cleaning(num_cols, scaler, categories)
+
+    print(f"📌 Cleaned dataset memory: {df.memory_usage(deep=True).sum() / 1e6:.1f} MB")
     return df
 
-if __name__ == "__main__":
-    # 🔹 Process the dataset
-    processed_data = load_and_preprocess_data()
-    print("✅ Data preprocessing complete!")
-
-    # 🔹 Ensure output directory exists
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+def _iter_raw_chunks(path, chunk_size):
+    """Yields raw string chunks from the merged CSV or from day partitions written by ingestion."""
+    if os.path.isdir(path):
+        return iter_partitions(path, chunk_size)
+    return pd.read_csv(path, dtype=str, chunksize=chunk_size, low_memory=False)
+
+def _iter_filled_chunks(chunk_size, path=None):
+    """Yields raw string chunks, forward-filled across chunk boundaries."""
+    carry = None
+    for chunk in _iter_raw_chunks(path or input_file, chunk_size):
+        chunk = chunk.ffill()
+        if carry is not None:
+            chunk = chunk.fillna(carry)  # Leading gaps take the previous chunk's last values
+        carry = chunk.iloc[-1]
+        yield chunk
+
+def load_and_preprocess_data_chunked(chunk_size=CHUNK_SIZE, output_path=output_file, transform=None, input_path=None):
+    """Preprocesses the merged dataset in fixed-size chunks and streams the result to disk.
+
+    Produces the same output as `load_and_preprocess_data`, but peak memory is bounded
+    by `chunk_size` rather than by the size of the input file. `input_path` may also be
+    a folder of day partitions written by `src.ingestion`.
+    """
+
+    input_path = input_path or input_file
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"❌ File not found: {input_path}")
+
+    print(f"📌 Streaming dataset in chunks of {chunk_size}: {input_path}")
+
+    # 🔹 Pass 1: a column is numeric only if every chunk converts cleanly
+    columns, non_numeric = None, set()
+    for chunk in _iter_filled_chunks(chunk_size, input_path):
+        if columns is None:
+            columns = list(chunk.columns)
+        for col in columns:
+            if col in non_numeric:
+                continue
+            try:
+                pd.to_numeric(chunk[col])
+            except ValueError:
+                non_numeric.add(col)
+
+    if columns is None:
+        raise ValueError(f"❌ Dataset is empty: {input_path}")
+
+    num_cols = [col for col in columns if col not in non_numeric]
+    cat_cols = [col for col in columns if col in non_numeric]
+
+    # 🔹 Pass 2: fit scaler statistics and category vocabularies incrementally
+    scaler = StandardScaler()
+    vocab = {col: set() for col in cat_cols}
+    for chunk in _iter_filled_chunks(chunk_size, input_path):
+        if num_cols:
+            scaler.partial_fit(chunk[num_cols].apply(pd.to_numeric))
+        for col in cat_cols:
+            vocab[col].update(chunk[col].astype(str).unique())
+
+    # LabelEncoder assigns codes in sorted order of the classes
+    categories = {col: sorted(values) for col, values in vocab.items()}
+    if transform is not None:
+        transform.set_cleaning(num_cols, scaler, categories)
+
+    # 🔹 Pass 3: transform each chunk and append it to the output file
+    rows = 0
+    with TableWriter(output_path) as writer:
+        for chunk in _iter_filled_chunks(chunk_size, input_path):
+            if num_cols:
+                chunk[num_cols] = scaler.transform(chunk[num_cols].apply(pd.to_numeric)).astype(np.float32)
+            for col in cat_cols:
+                chunk[col] = pd.Categorical(chunk[col].astype(str), categories=categories[col]).codes
+            writer.write(chunk)
+            rows += len(chunk)
+
+    print(f"✅ Streamed {rows} rows ({len(num_cols)} numeric, {len(cat_cols)} categorical columns)")
+    return output_path
 
-    # 🔹 Save processed data
-    processed_data.to_csv(output_file, index=False)
-
-    print(f"✅ Processed data saved to: {output_file}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preprocess the merged CICIDS2018 dataset.")
+    parser.add_argument("--chunked", action="store_true", help="Stream the input in bounded-memory chunks")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per chunk in streaming mode")
+    parser.add_argument("--input", default=input_file, help="Merged CSV, or a folder of day partitions from src.ingestion")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.input) and not args.chunked:
+        print("📌 Partitioned input is consumed partition by partition, switching to chunked mode")
+        args.chunked = True
+
+    transform = PreprocessingTransform()
+    if args.chunked:
+        load_and_preprocess_data_chunked(chunk_size=args.chunk_size, transform=transform, input_path=args.input)
+        print("✅ Data preprocessing complete!")
+        print(f"✅ Processed data saved to: {output_file}")
+    else:
+        input_file = args.input
+
+        # 🔹 Process the dataset
+        processed_data = load_and_preprocess_data(transform=transform)
+        print("✅ Data preprocessing complete!")
+
+        # 🔹 Save processed data
+        write_table(processed_data, output_file)
+
+        print(f"✅ Processed data saved to: {output_file}")
+
+    # 🔹 Persist the fitted scaler and encoders for inference
+    print(f"✅ Preprocessing transform saved to: {transform.save()}")
 
 
 
@@ -1,38 +1,108 @@
 import os
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
+from src.storage import read_table, write_table
+from src.transform import PreprocessingTransform, TRANSFORM_PATH, drop_staged_transform
+from src.window_features import (HOST_WINDOWS, HOST_COLUMN, TIME_COLUMN, PORT_COLUMN, BYTE_COLUMNS,
+                                 PACKET_COLUMNS, host_window_features, parse_seconds)
 
 # 📌 Define file paths
 DATA_FOLDER = os.path.join(os.path.dirname(__file__), "../processed_data")
 OUTPUT_FOLDER = os.path.join(os.path.dirname(__file__), "../processed_data")
 
-input_file = os.path.join(DATA_FOLDER, "cleaned_dataset.csv")  # Use cleaned dataset
-output_file = os.path.join(OUTPUT_FOLDER, "engineered_dataset.csv")  # Save location
+input_file = os.path.join(DATA_FOLDER, "cleaned_dataset.parquet")  # Use cleaned dataset
+output_file = os.path.join(OUTPUT_FOLDER, "engineered_dataset.parquet")  # Save location
 
-def feature_engineering():
-    """Performs feature engineering on the dataset."""
-    
-    # 🔹 Load the cleaned dataset
-    df = pd.read_csv(input_file, low_memory=False)
-    print(f"📌 Loaded dataset: {input_file}, Shape: {df.shape}")
+DROP_COLS = ["Flow ID", "Timestamp", "Src IP", "Dst IP"]
+
+# 📌 Engineered features, each computed as numerator / (denominator + 1)
+ENGINEERED_FEATURES = {
+    "Threat Intensity": ("Flow Byts/s", "Flow Duration"),
+    "Packet Ratio": ("Tot Fwd Pkts", "Tot Bwd Pkts"),
+}
+
+def _decode(df, col, transform, parse=None):
+    """Recovers raw numeric values of a cleaned column by undoing its scaling or encoding."""
+    if col in transform.clean_num_cols:
+        i = transform.clean_num_cols.index(col)
+        return df[col].to_numpy(dtype=np.float64) * transform.clean_scale[i] + transform.clean_mean[i]
+    if col in transform.categories:
+        # Parse each distinct value once, then look the rows up by code
+        vocab = transform.categories[col]
+        parsed = parse(vocab) if parse else pd.to_numeric(pd.Series(vocab), errors="coerce").to_numpy()
+        codes = df[col].to_numpy().astype(np.int64)
+        return np.where(codes >= 0, np.append(parsed, np.nan)[codes], np.nan)
+    return np.zeros(len(df))
+
+def _host_window_inputs(df, transform):
+    """Rebuilds the raw inputs of the per-host aggregates from the cleaned dataset."""
+    hosts = df[HOST_COLUMN].to_numpy()  # Encoded host codes identify hosts just as well
+    seconds = _decode(df, TIME_COLUMN, transform, parse=parse_seconds)
+    ports = np.round(_decode(df, PORT_COLUMN, transform))
+    byts = sum(np.nan_to_num(_decode(df, col, transform)) for col in BYTE_COLUMNS)
+    pkts = sum(np.nan_to_num(_decode(df, col, transform)) for col in PACKET_COLUMNS)
+    return hosts, seconds, ports, byts, pkts
+
+def engineer_features(df, transform=None):
+    """Drops identifiers, adds engineered features and standardizes the numeric columns.
+
+    Columns already standardized by preprocessing (as recorded on `transform`) are left
+    as they are, since a second StandardScaler pass over them is an identity. Per-host
+    window aggregates need `transform` to decode timestamps and are skipped without it.
+    """
+
+    # 🔹 Per-host sliding-window aggregates, computed before the identifiers are dropped
+    host_windows = ()
+    if transform is not None and {HOST_COLUMN, TIME_COLUMN} <= set(df.columns):
+        host_windows = HOST_WINDOWS
+        df = df.copy()
+        for name, values in host_window_features(*_host_window_inputs(df, transform), host_windows).items():
+            df[name] = values
 
     # 🔹 Drop unnecessary columns
-    drop_cols = ["Flow ID", "Timestamp", "Src IP", "Dst IP"]
-    df.drop(columns=drop_cols, inplace=True, errors='ignore')
+    df = df.drop(columns=DROP_COLS, errors='ignore')
     
     # 🔹 Create new features
-    df["Threat Intensity"] = df["Flow Byts/s"] / (df["Flow Duration"] + 1)  # Prevent division by zero
-    df["Packet Ratio"] = df["Tot Fwd Pkts"] / (df["Tot Bwd Pkts"] + 1)
+    for name, (numerator, denominator) in ENGINEERED_FEATURES.items():
+        df[name] = df[numerator] / (df[denominator] + 1)  # Prevent division by zero
 
-    # 🔹 Normalize numerical columns
-    num_cols = df.select_dtypes(include=['int64', 'float64']).columns
+    # 🔹 Normalize numerical columns that are not standardized yet
+    already_scaled = set(transform.clean_num_cols) if transform is not None else set()
+    num_cols = [col for col in df.select_dtypes(include="number").columns if col not in already_scaled]
     scaler = StandardScaler()
-    df[num_cols] = scaler.fit_transform(df[num_cols])
+    if num_cols:
+        df[num_cols] = scaler.fit_transform(df[num_cols]).astype(np.float32)
+
+    # 🔹 Record the feature definitions on the transform
+    if transform is not None:
+        feature_columns = [col for col in df.columns if col != "Label"]
+        transform.set_features(DROP_COLS, ENGINEERED_FEATURES, num_cols, scaler, feature_columns, host_windows)
+
+    return df
+
+def feature_engineering(transform_file=TRANSFORM_PATH):
+    """Performs feature engineering on the dataset."""
+    
+    # 🔹 Load the cleaned dataset
+    df = read_table(input_file)
+    print(f"📌 Loaded dataset: {input_file}, Shape: {df.shape}")
+
+    if os.path.exists(transform_file):
+        transform = PreprocessingTransform.load(transform_file)
+    else:
+        transform = None
+        print(f"⚠️ No preprocessing transform at {transform_file}, re-run data_preprocessing to create one")
+
+    df = engineer_features(df, transform)
+
+    if transform is not None:
+        print(f"✅ Preprocessing transform updated: {transform.save(transform_file)}")
+        drop_staged_transform()
 
     # 🔹 Save processed data
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    df.to_csv(output_file, index=False)
+    write_table(df, output_file)
     print(f"✅ Feature engineering complete! Data saved to {output_file}")
 
 if __name__ == "__main__":
-    feature_engineering()
\ No newline at end of file
+    feature_engineering()
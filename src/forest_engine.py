@@ -0,0 +1,211 @@
+import os
+import copy
+import json
+import time
+import argparse
+import tempfile
+import joblib
+import numpy as np
+
+# 📌 The compiled forest is a folder of .npy arrays next to the pickled classifier
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "../models")
+ENGINE_DIR = os.path.join(MODEL_DIR, "threat_classifier_forest")
+
+ENGINE_VERSION = 1
+BATCH_ROWS = 4096  # Rows traversed together, bounding the (rows x trees) node index matrix
+
+class ForestEngine:
+    """Array-based inference for a fitted RandomForestClassifier.
+
+    All trees are flattened into shared node arrays (feature, threshold, children, leaf
+    probabilities). A batch is traversed by advancing every (row, tree) pair one level per
+    step with vectorized gathers, dropping pairs from the active set once they reach a leaf.
+    """
+
+    ARRAYS = ("feature", "threshold", "left", "right", "missing_left", "value", "roots")
+
+    def __init__(self, arrays, classes, n_features, max_depth):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.classes = np.asarray(classes)
+        self.n_features = n_features
+        self.max_depth = max_depth
+        self.is_leaf = self.left == np.arange(len(self.left))
+
+    @classmethod
+    def from_classifier(cls, clf):
+        """Flattens the trees of a fitted forest into contiguous arrays."""
+        feature, threshold, left, right, missing_left, value, roots = [], [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in clf.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            leaf = tree.children_left == -1
+            nodes = np.arange(offset, offset + n)
+
+            feature.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+            threshold.append(np.where(leaf, np.inf, tree.threshold))
+            left.append(np.where(leaf, nodes, tree.children_left + offset).astype(np.int32))
+            right.append(np.where(leaf, nodes, tree.children_right + offset).astype(np.int32))
+            mgl = getattr(tree, "missing_go_to_left", None)
+            missing_left.append(np.zeros(n, dtype=bool) if mgl is None else np.asarray(mgl, dtype=bool))
+
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            proba = tree.value[:, 0, :]
+            totals = proba.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            value.append(proba / totals)
+
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        arrays = {
+            "feature": np.concatenate(feature),
+            "threshold": np.concatenate(threshold).astype(np.float64),
+            "left": np.concatenate(left),
+            "right": np.concatenate(right),
+            "missing_left": np.concatenate(missing_left),
+            "value": np.concatenate(value).astype(np.float64),
+            "roots": np.asarray(roots, dtype=np.int32),
+        }
+        return cls(arrays, clf.classes_, clf.n_features_in_, max_depth)
+
+    def save(self, folder=ENGINE_DIR):
+        """Writes the node arrays as .npy files that `load` can memory-map."""
+        os.makedirs(folder, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(folder, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(folder, "meta.json"), "w") as f:
+            json.dump({
+                "version": ENGINE_VERSION,
+                "classes": self.classes.tolist(),
+                "n_features": int(self.n_features),
+                "max_depth": int(self.max_depth),
+                "n_trees": int(len(self.roots)),
+            }, f, indent=2)
+        return folder
+
+    @classmethod
+    def load(cls, folder=ENGINE_DIR, mmap=True):
+        """Loads a saved engine; arrays are memory-mapped so loading costs only a few page faults."""
+        with open(os.path.join(folder, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != ENGINE_VERSION:
+            raise ValueError(f"❌ Forest engine version {meta['version']} is not supported (expected {ENGINE_VERSION})")
+        arrays = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in cls.ARRAYS}
+        return cls(arrays, meta["classes"], meta["n_features"], meta["max_depth"])
+
+    def _leaves(self, X):
+        """Returns the leaf reached by every (row, tree) pair, as a (rows, trees) array."""
+        n_trees = len(self.roots)
+        nodes = np.tile(self.roots, len(X))  # Pair k is row k // n_trees, tree k % n_trees
+        rows = np.repeat(np.arange(len(X)), n_trees)
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            x = X[rows[active], self.feature[current]]
+            go_left = (x <= self.threshold[current]) | (np.isnan(x) & self.missing_left[current])
+            nxt = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = nxt
+            active = active[~self.is_leaf[nxt]]
+        return nodes.reshape(len(X), n_trees)
+
+    def predict_proba(self, X):
+        """Class probabilities, averaged over trees in the same order as scikit-learn."""
+        X = np.asarray(X, dtype=np.float32)  # Trees compare float32 features
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"❌ Expected {self.n_features} features, got array of shape {X.shape}")
+
+        proba = np.zeros((len(X), len(self.classes)), dtype=np.float64)
+        for start in range(0, len(X), BATCH_ROWS):
+            leaves = self._leaves(X[start:start + BATCH_ROWS])
+            # Reducing over the tree axis adds the trees one after another, like scikit-learn
+            proba[start:start + BATCH_ROWS] = self.value[leaves].sum(axis=1)
+        return proba / len(self.roots)
+
+    def predict(self, X):
+        return self.classes[np.argmax(self.predict_proba(X), axis=1)]
+
+def verify_parity(engine, clf, X):
+    """Raises if the engine's predictions differ from the classifier's on `X`."""
+    expected, actual = clf.predict(X), engine.predict(X)
+    mismatches = int(np.sum(expected != actual))
+    if mismatches:
+        raise AssertionError(f"❌ Forest engine disagrees with the classifier on {mismatches}/{len(X)} rows")
+    if not np.allclose(clf.predict_proba(X), engine.predict_proba(X), atol=1e-9):
+        raise AssertionError("❌ Forest engine probabilities differ from the classifier")
+    print(f"✅ Forest engine matches the classifier on {len(X)} held-out rows")
+
+def export_forest(clf, X_check, folder=ENGINE_DIR):
+    """Compiles a fitted forest, checks parity on `X_check` and saves the arrays."""
+    engine = ForestEngine.from_classifier(clf)
+    verify_parity(engine, clf, X_check)
+    engine.save(folder)
+    print(f"✅ Forest engine saved to: {folder}")
+    return engine
+
+def _benchmark(engine, clf, X, batch_sizes, repeats=50):
+    """Times inference per batch size for the engine and for the forest on a single thread, as it is served.
+
+    The engine only wins on small batches, where scikit-learn's per-call overhead dominates:
+    against a single-threaded forest it measured about 8x faster for 1 flow and 2x for 32,
+    but about 3x slower for 1000, where the compiled tree traversal of scikit-learn pays off.
+    """
+    baseline = copy.copy(clf).set_params(n_jobs=1)  # Thread dispatch would dominate small batches
+    for batch_size in batch_sizes:
+        batch = np.ascontiguousarray(X[:batch_size])
+        timings = {}
+        for name, predict in (("sklearn", baseline.predict), ("engine", engine.predict)):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                predict(batch)
+            timings[name] = (time.perf_counter() - start) / repeats * 1000
+        print(f"📌 Batch of {len(batch)}: sklearn {timings['sklearn']:.2f} ms, engine {timings['engine']:.2f} ms "
+              f"({timings['sklearn'] / timings['engine']:.2f}x)")
+
+def _check_parity(rows=4000, features=12):
+    """Fits a small forest on synthetic flows and checks the engine, before and after a save, reproduces it."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((rows, features)).astype(np.float32)
+    y = np.array(["Benign", "DoS", "PortScan"])[(X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int) + (X[:, 3] > 1)]
+    fit, check = slice(0, rows // 2), slice(rows // 2, rows)
+    clf = RandomForestClassifier(n_estimators=20, max_depth=10, random_state=0).fit(X[fit], y[fit])
+
+    engine = ForestEngine.from_classifier(clf)
+    verify_parity(engine, clf, X[check])
+    with tempfile.TemporaryDirectory() as folder:
+        engine.save(folder)
+        verify_parity(ForestEngine.load(folder), clf, X[check])
+        assert np.array_equal(ForestEngine.load(folder).classes, clf.classes_), "classes changed by save/load"
+
+if __name__ == "__main__":
+    from src.model_registry import BUNDLE_TRANSFORM, publish, served_folder
+    from src.model_training import MODEL_PATH, load_training_matrix, split_training_matrix
+    from src.transform import PreprocessingTransform
+
+    parser = argparse.ArgumentParser(description="Compile the published threat classifier into array form.")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 32, 1000],
+                        help="Batch sizes for the latency comparison")
+    parser.add_argument("--check", action="store_true",
+                        help="Only check that the engine reproduces a small fitted forest's probabilities")
+    args = parser.parse_args()
+    if args.check:
+        _check_parity()
+        raise SystemExit
+
+    # The engine is published with the transform the served forest was trained with
+    folder = served_folder("forest")
+    clf = joblib.load(os.path.join(folder, os.path.basename(MODEL_PATH)))
+    X, y, _ = load_training_matrix()
+    _, X_test, _, _ = split_training_matrix(X, y)
+    engine = export_forest(clf, X_test)
+    publish("engine", PreprocessingTransform.load(os.path.join(folder, BUNDLE_TRANSFORM)))
+
+    start = time.perf_counter()
+    engine = ForestEngine.load()
+    print(f"📌 Engine loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+    _benchmark(engine, clf, X_test, args.batch_size)
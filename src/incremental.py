@@ -0,0 +1,259 @@
+import io
+import os
+import glob
+import argparse
+import itertools
+import joblib
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from src import data_preprocessing, feature_engineering
+from src.storage import ParquetTable, TableWriter, drop_parts, next_part
+from src.transform import PreprocessingTransform, STAGED_TRANSFORM_PATH, training_transform_path
+from src.window_features import HostWindowState
+
+# 📌 Define file paths
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "../processed_data")
+STATE_FILE = os.path.join(DATA_FOLDER, "append_state.pkl")
+
+CHUNK_SIZE = 500_000  # Rows per chunk when reading new captures or rewriting history
+DRIFT_THRESHOLD = 0.25  # Mean shift (in baseline standard deviations) that calls for a re-baseline
+
+class RunningStats:
+    """Per-column running count, mean and sum of squared deviations (Welford, merged batch-wise)."""
+
+    def __init__(self, count, mean, m2):
+        self.count = np.asarray(count, dtype=np.float64)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.m2 = np.asarray(m2, dtype=np.float64)
+
+    @classmethod
+    def from_scaler(cls, mean, scale, count):
+        """Seeds the statistics from a fitted scaler's mean and scale over `count` rows."""
+        mean = np.asarray(mean, dtype=np.float64)
+        return cls(np.full(len(mean), float(count)), mean, np.asarray(scale) ** 2 * count)
+
+    def update(self, values):
+        """Merges a batch of rows (NaNs ignored) into the running statistics."""
+        values = np.asarray(values, dtype=np.float64)
+        batch_count = np.sum(~np.isnan(values), axis=0).astype(np.float64)
+        present = batch_count > 0
+        if not present.any():
+            return
+
+        batch_mean = np.zeros_like(self.mean)
+        batch_m2 = np.zeros_like(self.m2)
+        batch_mean[present] = np.nanmean(values[:, present], axis=0)
+        batch_m2[present] = np.nansum((values[:, present] - batch_mean[present]) ** 2, axis=0)
+
+        total = self.count + batch_count
+        delta = batch_mean - self.mean
+        ratio = np.divide(batch_count, total, out=np.zeros_like(total), where=total > 0)
+        self.mean = self.mean + delta * ratio
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * ratio
+        self.count = total
+
+    @property
+    def scale(self):
+        var = np.divide(self.m2, self.count, out=np.zeros_like(self.m2), where=self.count > 0)
+        scale = np.sqrt(var)
+        scale[scale == 0] = 1.0  # Same convention as StandardScaler
+        return scale
+
+def drift(stats, mean, scale):
+    """Largest mean shift, in baseline standard deviations, across the tracked columns."""
+    if not len(mean):
+        return 0.0
+    return float(np.max(np.abs(stats.mean - mean) / scale))
+
+def _bootstrap_state():
+    """Creates the append state from the transform and engineered dataset of a full run."""
+    transform = PreprocessingTransform.load(training_transform_path())
+    rows = ParquetTable(feature_engineering.output_file).num_rows
+    print(f"📌 Bootstrapping append state from {rows} engineered rows")
+    return {
+        "transform": transform,
+        "running": RunningStats.from_scaler(transform.clean_mean, transform.clean_scale, rows),
+        # The full run consumed every row of the merged dataset
+        "watermarks": {os.path.abspath(data_preprocessing.input_file): rows},
+        "carry": None,
+        "rows": rows,
+    }
+
+def load_state(path=STATE_FILE):
+    return joblib.load(path) if os.path.exists(path) else _bootstrap_state()
+
+def _skip_rows(f, header, rows):
+    """Watermark after the first `rows` data lines, for row counts from a full run or an older state."""
+    f.seek(len(header))
+    offset, tail = len(header), b""
+    for line in itertools.islice(f, rows):
+        offset += len(line)
+        tail = (tail + line)[-64:]
+    return {"header": header.decode(), "offset": offset, "tail": tail.hex()}
+
+def _tail_matches(f, mark):
+    """Whether the bytes before the watermark are still the ones read, i.e. the file was only appended to."""
+    tail = bytes.fromhex(mark["tail"])
+    f.seek(mark["offset"] - len(tail))
+    return f.read(len(tail)) == tail
+
+def _iter_new_rows(input_path, watermarks, chunk_size):
+    """Yields the rows of `input_path` not consumed by earlier runs, updating the watermarks.
+
+    CSV files are tracked by the byte offset of the last complete line read, so reading
+    starts with a seek however long the history is; partition folders by the part files
+    already read.
+    """
+    key = os.path.abspath(input_path)
+    if os.path.isdir(input_path):
+        done = set(watermarks.get(key, []))
+        for part_path in sorted(glob.glob(os.path.join(input_path, "day=*", "*.parquet"))):
+            name = os.path.relpath(part_path, input_path)
+            if name in done:
+                continue
+            for batch in pq.ParquetFile(part_path).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+            done.add(name)
+            watermarks[key] = sorted(done)
+    else:
+        with open(input_path, "rb") as f:
+            header = f.readline()
+            mark = watermarks.get(key, 0)
+            if isinstance(mark, int):
+                mark = watermarks[key] = _skip_rows(f, header, mark)
+            elif mark["header"] != header.decode() or not _tail_matches(f, mark):
+                raise ValueError(f"❌ Rows of {input_path} already appended were rewritten, re-run the pipeline")
+
+            offset = mark["offset"]
+            f.seek(offset)
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if lines and not lines[-1].endswith(b"\n"):
+                    lines.pop()  # An unterminated last line is left for the next run
+                if not lines:
+                    break
+                data = b"".join(lines)
+                chunk = pd.read_csv(io.BytesIO(header + data), dtype=str, low_memory=False)
+                if not chunk.empty:
+                    yield chunk
+                offset += len(data)
+                watermarks[key] = {"header": header.decode(), "offset": offset, "tail": data[-64:].hex()}
+
+def _extend_vocabularies(transform, chunk):
+    """Appends unseen category values at the end of each vocabulary, keeping existing codes stable."""
+    for col, vocab in transform.categories.items():
+        if col in chunk.columns:
+            known = set(vocab)
+            vocab.extend(sorted(value for value in chunk[col].astype(str).unique() if value not in known))
+
+def append(input_path=None, rebaseline=False, chunk_size=CHUNK_SIZE, state_path=STATE_FILE):
+    """Engineers only the rows added since the last run and appends them to the engineered dataset."""
+    input_path = input_path or data_preprocessing.input_file
+    output_path = feature_engineering.output_file
+    state = load_state(state_path)
+    state.setdefault("hosts", HostWindowState())  # Per-host aggregates carry over between chunks and runs
+    transform = state["transform"]
+    columns = pq.read_schema(output_path).names
+
+    # 🔹 The newly engineered rows become one new part of the dataset; earlier rows are not touched
+    part_path = next_part(output_path)
+    tmp_path = os.path.join(os.path.dirname(part_path), "." + os.path.basename(part_path))
+    added = 0
+    with TableWriter(tmp_path, schema=pq.read_schema(output_path)) as writer:
+        for chunk in _iter_new_rows(input_path, state["watermarks"], chunk_size):
+            chunk = chunk.ffill()
+            if state["carry"] is not None:
+                chunk = chunk.fillna(state["carry"])
+            state["carry"] = chunk.iloc[-1]
+
+            _extend_vocabularies(transform, chunk)
+            raw = chunk.reindex(columns=transform.clean_num_cols).apply(pd.to_numeric, errors="coerce")
+            state["running"].update(raw.to_numpy(dtype=np.float64))
+
+            # New rows are scaled with the baseline statistics, like the history they join
+            writer.write(transform.engineer(chunk, columns, state["hosts"]))
+            added += len(chunk)
+    if added:
+        os.replace(tmp_path, part_path)
+    state["rows"] += added
+    print(f"✅ Appended {added} rows ({state['rows']} total) to {output_path}")
+
+    # 🔹 Re-baseline when asked, otherwise report how far the statistics have drifted
+    current = drift(state["running"], transform.clean_mean, transform.clean_scale)
+    if rebaseline:
+        rebaseline_history(state, chunk_size)
+    elif current > DRIFT_THRESHOLD:
+        print(f"⚠️ Normalization statistics drifted by {current:.2f} std, consider running with --rebaseline")
+    else:
+        print(f"📌 Normalization drift: {current:.3f} std")
+
+    # The served transform stays with its model until one is retrained on the new rows
+    joblib.dump(state, state_path)
+    state["transform"].save(STAGED_TRANSFORM_PATH)
+    return added
+
+def _restandardize(frame, old, new_clean_mean, new_clean_scale):
+    """Recovers pre-scaling values from stored rows and recomputes them under new clean statistics."""
+    columns = {}
+    feature_index = {col: i for i, col in enumerate(old.feature_num_cols)}
+    clean_index = {col: i for i, col in enumerate(old.clean_num_cols)}
+    for col in frame.columns:
+        values = frame[col].to_numpy(dtype=np.float64)
+        if col in feature_index:
+            i = feature_index[col]
+            values = values * old.feature_scale[i] + old.feature_mean[i]
+        if col in clean_index:
+            i = clean_index[col]
+            raw = values * old.clean_scale[i] + old.clean_mean[i]
+            values = (raw - new_clean_mean[i]) / new_clean_scale[i]
+        columns[col] = values.astype(np.float32)
+    return old._add_engineered(columns)
+
+def rebaseline_history(state, chunk_size=CHUNK_SIZE):
+    """Rescales the whole engineered history with the current running statistics."""
+    transform = state["transform"]
+    output_path = feature_engineering.output_file
+    new_mean, new_scale = state["running"].mean, state["running"].scale
+    history = ParquetTable(output_path)
+    names = history.schema_arrow.names
+    feature_cols = [col for col in transform.feature_num_cols if col in names]
+
+    # 🔹 Pass 1: refit the feature-stage statistics on the re-standardized values
+    feature_stats = RunningStats(np.zeros(len(feature_cols)), np.zeros(len(feature_cols)), np.zeros(len(feature_cols)))
+    for batch in history.iter_batches(batch_size=chunk_size):
+        columns = _restandardize(batch.to_pandas(), transform, new_mean, new_scale)
+        feature_stats.update(np.column_stack([columns[col] for col in feature_cols]))
+
+    # 🔹 Pass 2: rewrite every row with the new statistics
+    rebased = PreprocessingTransform()
+    rebased.__dict__.update(transform.__dict__)
+    rebased.clean_mean, rebased.clean_scale = new_mean.copy(), new_scale.copy()
+    rebased.feature_num_cols = feature_cols
+    rebased.feature_mean, rebased.feature_scale = feature_stats.mean, feature_stats.scale
+
+    tmp_path = output_path.replace(".parquet", ".tmp.parquet")
+    with TableWriter(tmp_path) as writer:
+        for batch in history.iter_batches(batch_size=chunk_size):
+            frame = batch.to_pandas()
+            columns = _restandardize(frame, transform, new_mean, new_scale)
+            X = rebased._scaled_matrix(columns, names, len(frame))
+            writer.write(pd.DataFrame(X.astype(np.float32), columns=names))
+    os.replace(tmp_path, output_path)
+    drop_parts(output_path)  # Compacted into the rewritten file
+
+    state["transform"] = rebased
+    print(f"✅ Re-baselined {history.num_rows} rows with the current statistics")
+
+if __name__ == "__main__":
+    # Append through the package module so the pickled state does not reference __main__
+    from src import incremental
+
+    parser = argparse.ArgumentParser(description="Append newly captured flows to the engineered dataset.")
+    parser.add_argument("--input", default=data_preprocessing.input_file,
+                        help="Capture CSV (tracked by byte offset) or folder of day partitions")
+    parser.add_argument("--rebaseline", action="store_true",
+                        help="Rescale the whole history with the current running statistics")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows per chunk")
+    args = parser.parse_args()
+    incremental.append(args.input, rebaseline=args.rebaseline, chunk_size=args.chunk_size)
@@ -0,0 +1,165 @@
+import os
+import re
+import glob
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor
+from src.storage import TableWriter
+
+# 📌 Define file paths
+RAW_FOLDER = os.path.join(os.path.dirname(__file__), "../data/CICIDS2018")  # One CSV per capture day
+OUTPUT_FOLDER = os.path.join(os.path.dirname(__file__), "../processed_data/merged")  # Partitioned by day
+
+CHUNK_SIZE = 500_000  # Rows parsed at a time by each worker
+TIMESTAMP_FORMAT = "%d/%m/%Y %H:%M:%S"  # CICFlowMeter timestamp format
+
+# 📌 Alternative spellings of CICFlowMeter columns, mapped to the names used by the pipeline
+COLUMN_ALIASES = {
+    "Destination Port": "Dst Port",
+    "Source Port": "Src Port",
+    "Source IP": "Src IP",
+    "Destination IP": "Dst IP",
+    "Total Fwd Packets": "Tot Fwd Pkts",
+    "Total Backward Packets": "Tot Bwd Pkts",
+    "Total Length of Fwd Packets": "TotLen Fwd Pkts",
+    "Total Length of Bwd Packets": "TotLen Bwd Pkts",
+    "Flow Bytes/s": "Flow Byts/s",
+    "Flow Packets/s": "Flow Pkts/s",
+}
+
+def normalize_column(name):
+    """Strips stray whitespace from a column name and resolves known aliases."""
+    name = re.sub(r"\s+", " ", str(name)).strip()
+    return COLUMN_ALIASES.get(name, name)
+
+def _read_chunks(path, chunk_size):
+    return pd.read_csv(path, dtype=str, chunksize=chunk_size, low_memory=False)
+
+def _clean_chunk(chunk, columns):
+    """Drops repeated header rows and aligns a raw chunk with the merged column layout."""
+    # Repeated headers show up as rows whose values equal their own column names
+    header_rows = chunk.eq(pd.Series(chunk.columns, index=chunk.columns)).sum(axis=1) > len(chunk.columns) // 2
+    chunk = chunk[~header_rows]
+    chunk.columns = [normalize_column(col) for col in chunk.columns]
+    chunk = chunk.loc[:, ~chunk.columns.duplicated()]
+    return chunk.reindex(columns=columns)
+
+def _flow_hashes(chunk):
+    # Missing values are hashed as empty strings, whichever null marker the reader produced
+    return pd.util.hash_pandas_object(chunk.fillna(""), index=False).to_numpy()
+
+def _schema(columns):
+    # Raw values stay strings so that preprocessing sees the same input as the merged CSV
+    return pa.schema([(col, pa.string()) for col in columns])
+
+def _day_keys(chunk):
+    timestamps = pd.to_datetime(chunk["Timestamp"], format=TIMESTAMP_FORMAT, errors="coerce")
+    return timestamps.dt.strftime("%Y-%m-%d").fillna("unknown")
+
+def _part_path(output_folder, day, source):
+    return os.path.join(output_folder, f"day={day}", f"part-{source}.parquet")
+
+def ingest_file(path, columns, output_folder=OUTPUT_FOLDER, chunk_size=CHUNK_SIZE):
+    """Parses one capture file into day partitions, dropping duplicate flows within the file.
+
+    Returns the source name, the number of rows written and the hashes of the kept flows.
+    """
+    source = os.path.splitext(os.path.basename(path))[0]
+    writers = {}
+    seen = np.empty(0, dtype=np.uint64)
+    rows = 0
+    try:
+        for chunk in _read_chunks(path, chunk_size):
+            chunk = _clean_chunk(chunk, columns)
+
+            # 🔹 Drop flows already seen earlier in this file
+            hashes = _flow_hashes(chunk)
+            keep = ~pd.Series(hashes).duplicated().to_numpy() & ~np.isin(hashes, seen)
+            chunk, hashes = chunk[keep], hashes[keep]
+            seen = np.union1d(seen, hashes)
+
+            # 🔹 Route rows to their day partition
+            for day, part in chunk.groupby(_day_keys(chunk), sort=False):
+                if day not in writers:
+                    writers[day] = TableWriter(_part_path(output_folder, day, source), schema=_schema(columns))
+                writers[day].write(part)
+            rows += len(chunk)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return source, rows, seen
+
+def _drop_rows(output_folder, source, duplicates):
+    """Removes flows of one source that an earlier file already contributed."""
+    removed = 0
+    for part_path in glob.glob(_part_path(output_folder, "*", source)):
+        part = pd.read_parquet(part_path)
+        keep = ~np.isin(_flow_hashes(part), duplicates)
+        removed += int((~keep).sum())
+        if keep.all():
+            continue
+        if keep.any():
+            pq.write_table(pa.Table.from_pandas(part[keep], schema=_schema(part.columns), preserve_index=False), part_path)
+        else:
+            os.remove(part_path)
+    return removed
+
+def ingest(raw_folder=RAW_FOLDER, output_folder=OUTPUT_FOLDER, workers=None, chunk_size=CHUNK_SIZE):
+    """Parses every per-day capture in parallel and writes a day-partitioned merged dataset."""
+    paths = sorted(glob.glob(os.path.join(raw_folder, "*.csv")))
+    if not paths:
+        raise FileNotFoundError(f"❌ No CSV files found in: {raw_folder}")
+
+    # 🔹 Build the union of normalized column names, in first-seen order
+    columns = []
+    for path in paths:
+        for col in pd.read_csv(path, nrows=0).columns:
+            col = normalize_column(col)
+            if col not in columns:
+                columns.append(col)
+    if "Timestamp" not in columns:
+        raise ValueError("❌ Capture files must contain a 'Timestamp' column")
+
+    if os.path.exists(output_folder):
+        shutil.rmtree(output_folder)
+    os.makedirs(output_folder)
+
+    # 🔹 Parse the files in a process pool
+    print(f"📌 Ingesting {len(paths)} files with {workers or os.cpu_count()} workers")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(ingest_file, path, columns, output_folder, chunk_size) for path in paths]
+        results = [future.result() for future in futures]
+
+    # 🔹 Drop flows repeated across files, keeping the first file's copy
+    seen = np.empty(0, dtype=np.uint64)
+    total = 0
+    for source, rows, hashes in results:
+        duplicates = hashes[np.isin(hashes, seen)]
+        if len(duplicates):
+            rows -= _drop_rows(output_folder, source, duplicates)
+        seen = np.union1d(seen, hashes)
+        total += rows
+        print(f"📌 {source}: {rows} flows")
+
+    print(f"✅ Ingested {total} unique flows into {output_folder}")
+    return output_folder
+
+def iter_partitions(folder, chunk_size=CHUNK_SIZE):
+    """Yields the ingested flows as DataFrame chunks, partition by partition in day order."""
+    for part_path in sorted(glob.glob(os.path.join(folder, "day=*", "*.parquet"))):
+        for batch in pq.ParquetFile(part_path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge per-day CICIDS2018 captures into day partitions.")
+    parser.add_argument("--raw-folder", default=RAW_FOLDER, help="Folder containing one CSV per capture day")
+    parser.add_argument("--output-folder", default=OUTPUT_FOLDER, help="Destination of the partitioned dataset")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (defaults to all cores)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows parsed at a time by each worker")
+    args = parser.parse_args()
+    ingest(args.raw_folder, args.output_folder, args.workers, args.chunk_size)
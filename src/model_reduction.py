@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score
+from src import data_preprocessing
+from src.model_training import MODEL_DIR, load_training_matrix, make_forest, save_model, split_training_matrix
+from src.model_registry import publish
+from src.transform import load_training_transform
+
+# 📌 The reduced model ships with its own transform and column list
+REDUCED_MODEL_PATH = os.path.join(MODEL_DIR, "threat_classifier_reduced.pkl")
+REDUCED_TRANSFORM_PATH = os.path.join(MODEL_DIR, "preprocessing_transform_reduced.pkl")
+REDUCED_FEATURES_PATH = os.path.join(MODEL_DIR, "reduced_features.json")
+
+TOP_K = (5, 10, 20, 40)  # Feature counts retrained and compared against the full model
+MAX_ACCURACY_DROP = 0.01  # Accuracy loss (absolute) accepted for the reduced model
+RAW_SAMPLE_ROWS = 10_000  # Raw flows used to time the preprocessing of each feature subset
+
+def rank_features(clf, features):
+    """Features sorted by decreasing impurity importance, with their importances."""
+    order = np.argsort(-clf.feature_importances_, kind="stable")
+    return [(features[i], float(clf.feature_importances_[i])) for i in order]
+
+def _latency_us(clf, X):
+    """Per-flow prediction time on `X` with a single thread."""
+    n_jobs = clf.n_jobs
+    clf.set_params(n_jobs=1)
+    start = time.perf_counter()
+    y_pred = clf.predict(X)
+    elapsed = time.perf_counter() - start
+    clf.set_params(n_jobs=n_jobs)
+    return y_pred, elapsed / len(X) * 1e6
+
+def _raw_sample(rows=RAW_SAMPLE_ROWS):
+    """A sample of raw flows for timing the transform, if the merged dataset is available."""
+    path = data_preprocessing.input_file
+    if os.path.isdir(path):
+        return next(data_preprocessing._iter_raw_chunks(path, rows), None)
+    if os.path.exists(path):
+        return pd.read_csv(path, dtype=str, nrows=rows, low_memory=False)
+    return None
+
+def _transform_us(transform, sample):
+    """Per-flow preprocessing time of `transform` on `sample`."""
+    start = time.perf_counter()
+    transform.transform(sample)
+    return (time.perf_counter() - start) / len(sample) * 1e6
+
+def reduce_model(ks=TOP_K, max_drop=MAX_ACCURACY_DROP, n_jobs=-1, params=None):
+    """Retrains the forest on its top-k features and saves the smallest model within `max_drop`.
+
+    The full model is trained first to rank the features. Each k in `ks` is then retrained on
+    the k most important columns, and the accuracy and per-flow cost of every model are
+    reported. The cost covers prediction plus, when the fitted transform and the merged dataset
+    are available, preprocessing raw flows into just those columns. The smallest k within
+    `max_drop` of the full model's accuracy that is also cheaper per flow than the full model
+    is saved with a transform that computes only its columns.
+    """
+    X, y, features = load_training_matrix()
+    X_train, X_test, y_train, y_test = split_training_matrix(X, y)
+
+    print(f"Training the full model on {len(features)} features...")
+    full = make_forest(params, n_jobs).fit(X_train, y_train)
+    y_pred, full_latency = _latency_us(full, X_test)
+    full_accuracy = accuracy_score(y_test, y_pred)
+    ranking = rank_features(full, features)
+    index = {name: i for i, name in enumerate(features)}
+
+    transform = load_training_transform()
+    sample = _raw_sample() if transform is not None else None
+
+    def transform_us(names):
+        return _transform_us(transform.reduced(names), sample) if sample is not None else 0.0
+
+    full_cost = full_latency + transform_us(features)
+    rows = [{"k": len(features), "accuracy": full_accuracy, "drop": 0.0, "latency_us": full_cost, "speedup": 1.0}]
+    models = {}
+    for k in sorted(set(k for k in ks if 0 < k < len(features))):
+        names = [name for name, _ in ranking[:k]]
+        columns = [index[name] for name in names]
+        clf = make_forest(params, n_jobs).fit(X_train[:, columns], y_train)
+        y_pred, latency = _latency_us(clf, X_test[:, columns])
+        accuracy = accuracy_score(y_test, y_pred)
+        cost = latency + transform_us(names)
+        rows.append({"k": k, "accuracy": accuracy, "drop": full_accuracy - accuracy,
+                     "latency_us": cost, "speedup": full_cost / cost})
+        models[k] = clf
+
+    table = pd.DataFrame(rows).sort_values("k").round({"accuracy": 4, "drop": 4, "latency_us": 1, "speedup": 2})
+    if sample is None:
+        print("⚠️ Raw flows or fitted transform not found, latencies cover prediction only")
+    print("📌 Accuracy against dimensionality:")
+    print(table.to_string(index=False))
+
+    within = [row for row in rows[1:] if row["drop"] <= max_drop]
+    if not within:
+        print(f"⚠️ No reduced model stays within {max_drop:.4f} accuracy of the full model, nothing saved")
+        return None
+    faster = [row["k"] for row in within if row["speedup"] > 1]
+    if not faster:
+        print("⚠️ No reduced model within the accuracy drop is faster than the full model, nothing saved")
+        return None
+    k = min(faster)
+    selected = [name for name, _ in ranking[:k]]
+
+    # 🔹 Save the reduced model, its column list and a transform that computes only those columns
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    save_model(models[k], REDUCED_MODEL_PATH)
+    raw_columns = None
+    if transform is not None:
+        reduced = transform.reduced(selected)
+        reduced.save(REDUCED_TRANSFORM_PATH)
+        raw_columns = reduced.raw_columns()
+    with open(REDUCED_FEATURES_PATH, "w") as f:
+        json.dump({
+            "k": k,
+            "features": selected,
+            "raw_columns": raw_columns,
+            "importances": dict(ranking),
+            "table": table.to_dict(orient="records"),
+        }, f, indent=2)
+
+    row = next(row for row in rows if row["k"] == k)
+    print(f"✅ Reduced model with {k} features saved to: {REDUCED_MODEL_PATH} "
+          f"(accuracy drop {row['drop']:.4f}, {row['speedup']:.2f}x faster per flow)")
+    if transform is not None:
+        publish("reduced", reduced)
+    return models[k]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrain the threat classifier on its most important features.")
+    parser.add_argument("--top-k", type=int, nargs="+", default=list(TOP_K), help="Feature counts to try")
+    parser.add_argument("--max-drop", type=float, default=MAX_ACCURACY_DROP, help="Accepted accuracy loss")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel jobs for training (-1 uses all cores)")
+    args = parser.parse_args()
+    reduce_model(args.top_k, args.max_drop, n_jobs=args.n_jobs)
@@ -0,0 +1,224 @@
+import os
+import glob
+import json
+import shutil
+import asyncio
+import hashlib
+import argparse
+import datetime
+import joblib
+import numpy as np
+import pandas as pd
+from starlette.concurrency import run_in_threadpool
+from src.transform import MODEL_DIR, PreprocessingTransform, TRANSFORM_PATH
+
+# 📌 Each served model is published with the transform it was trained with, as one versioned
+# folder under models/served/<kind>/; CURRENT.json names the version being served
+SERVED_DIR = os.path.join(MODEL_DIR, "served")
+POINTER_FILE = "CURRENT.json"
+BUNDLE_TRANSFORM = "preprocessing_transform.pkl"
+KEEP_VERSIONS = 3  # Published versions kept on disk per kind, the served one included
+
+RELOAD_INTERVAL = float(os.environ.get("CLASSIFY_RELOAD_INTERVAL", 5.0))  # Seconds between pointer checks
+WARMUP_ROWS = 1024  # Rows of the canned batch scored before a model is swapped in
+
+def artifact_paths(kind):
+    """Files a trainer writes for a model kind: (model files, transform file)."""
+    if kind == "forest":
+        from src.model_training import MODEL_PATH
+        return [MODEL_PATH], TRANSFORM_PATH
+    if kind == "engine":
+        from src.forest_engine import ENGINE_DIR
+        return sorted(glob.glob(os.path.join(ENGINE_DIR, "*.npy"))) + [os.path.join(ENGINE_DIR, "meta.json")], TRANSFORM_PATH
+    if kind == "cascade":
+        from src.cascade import CASCADE_PATH
+        return [CASCADE_PATH], TRANSFORM_PATH
+    if kind == "reduced":
+        from src.model_reduction import REDUCED_MODEL_PATH, REDUCED_TRANSFORM_PATH
+        return [REDUCED_MODEL_PATH], REDUCED_TRANSFORM_PATH
+    raise ValueError(f"❌ Unknown model kind: {kind}")
+
+def served_version(kind):
+    """Version the pointer of a model kind names, None until one is published."""
+    try:
+        with open(os.path.join(SERVED_DIR, kind, POINTER_FILE)) as f:
+            return json.load(f)["version"]
+    except FileNotFoundError:
+        return None
+
+def publish(kind, transform):
+    """Publishes a kind's trained model files and the transform they were trained with.
+
+    Both are copied into a new version folder, and the kind's pointer is switched to it only
+    once the folder is complete, so a server never pairs a model with another one's transform.
+    """
+    model_paths, _ = artifact_paths(kind)
+    folder = os.path.join(SERVED_DIR, kind)
+    staging = os.path.join(folder, f".staging-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for path in model_paths:
+        shutil.copyfile(path, os.path.join(staging, os.path.basename(path)))
+    joblib.dump(transform, os.path.join(staging, BUNDLE_TRANSFORM))
+
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(staging)):
+        with open(os.path.join(staging, name), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    current = served_version(kind)
+    if current is not None and current.endswith(digest.hexdigest()[:8]):
+        shutil.rmtree(staging)
+        print(f"📌 {kind} classifier version {current} is already published")
+        return current
+    version = f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{digest.hexdigest()[:8]}"
+    os.replace(staging, os.path.join(folder, version))
+
+    pointer = os.path.join(folder, POINTER_FILE)
+    with open(f"{pointer}.tmp", "w") as f:
+        json.dump({"version": version, "published_at": datetime.datetime.now().isoformat()}, f, indent=2)
+    os.replace(f"{pointer}.tmp", pointer)
+
+    # 🔹 Versions are named by publish time; older ones beyond KEEP_VERSIONS are removed
+    versions = sorted(name for name in os.listdir(folder) if os.path.isdir(os.path.join(folder, name))
+                      and not name.startswith("."))
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+    print(f"✅ Published {kind} classifier version {version} to {folder}")
+    return version
+
+class ModelVersion:
+    """A loaded model with the transform it was trained with, identified by its published version."""
+
+    def __init__(self, kind, model, transform, version):
+        self.kind = kind
+        self.model = model
+        self.transform = transform
+        self.version = version
+        self.loaded_at = datetime.datetime.now().isoformat()
+        self.classes = np.asarray(getattr(model, "classes_", getattr(model, "classes", None))).tolist()
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)
+
+    def describe(self):
+        return {"version": self.version, "kind": self.kind, "loaded_at": self.loaded_at,
+                "features": len(self.transform.feature_columns), "classes": self.classes}
+
+def served_folder(kind):
+    """Folder of the version a model kind's pointer names."""
+    version = served_version(kind)
+    if version is None:
+        raise FileNotFoundError(f"❌ No {kind} classifier has been published to {os.path.join(SERVED_DIR, kind)}, "
+                                f"train one first")
+    return os.path.join(SERVED_DIR, kind, version)
+
+def load_version(kind):
+    """Loads and warms up the published version of a model kind."""
+    folder = served_folder(kind)
+    if kind == "engine":
+        from src.forest_engine import ForestEngine
+        model = ForestEngine.load(folder)
+    else:
+        model = joblib.load(os.path.join(folder, os.path.basename(artifact_paths(kind)[0][0])))
+
+    # Batches are already vectorized; per-call thread pools only add latency
+    for estimator in (model, getattr(model, "forest", None)):
+        if hasattr(estimator, "n_jobs"):
+            estimator.set_params(n_jobs=1)
+
+    candidate = ModelVersion(kind, model, PreprocessingTransform.load(os.path.join(folder, BUNDLE_TRANSFORM)),
+                             os.path.basename(folder))
+    warm_up(candidate)
+    return candidate
+
+def warm_up(candidate, rows=WARMUP_ROWS):
+    """Scores a canned batch to fault the model's pages in and check that it produces valid output."""
+    X = candidate.transform.transform(pd.DataFrame(index=range(rows)))
+    X = X + np.random.default_rng(0).standard_normal(X.shape).astype(np.float32)  # Spread rows over many tree paths
+    proba = candidate.model.predict_proba(X)
+    if proba.shape != (rows, len(candidate.classes)) or not np.all(np.isfinite(proba)):
+        raise ValueError(f"❌ Warm-up produced invalid probabilities of shape {proba.shape}")
+    if hasattr(candidate.model, "reset_exits"):
+        candidate.model.reset_exits()  # Cascade exit rates should only count real traffic
+
+class ModelRegistry:
+    """Holds the served model version and swaps in new ones without stopping the server.
+
+    Only a change of the kind's pointer triggers a reload. The new version is loaded and
+    warmed up on a worker thread, then published with a single reference assignment: requests
+    already running keep the version they started with, and later requests see the new one.
+    The replaced version is kept for `rollback`.
+    """
+
+    def __init__(self, kind, interval=RELOAD_INTERVAL):
+        self.kind = kind
+        self.interval = interval
+        self.current = None
+        self.previous = None
+        self.rejected = None  # Published version that failed to load or was rolled back
+        self.last_error = None
+        self.reloads = 0
+        self._lock = None
+
+    def load_initial(self):
+        self.current = load_version(self.kind)
+        print(f"✅ Loaded {self.kind} classifier version {self.current.version}")
+
+    async def reload(self):
+        """Loads the published version and swaps it in if it loads, warms up and differs."""
+        self._lock = self._lock or asyncio.Lock()
+        async with self._lock:
+            version = served_version(self.kind)
+            if version == self.current.version:
+                return False
+            try:
+                candidate = await run_in_threadpool(load_version, self.kind)
+            except Exception as e:
+                self.rejected = version
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"⚠️ Keeping version {self.current.version}, version {version} failed to load: {self.last_error}")
+                return False
+
+            self.last_error = None
+            if candidate.version == self.current.version:
+                return False
+            self.previous, self.current = self.current, candidate
+            self.reloads += 1
+            print(f"✅ Swapped in {self.kind} classifier version {candidate.version} "
+                  f"(previous {self.previous.version})")
+            return True
+
+    def rollback(self):
+        """Restores the previous version; its replacement is not reloaded until another version is published."""
+        if self.previous is None:
+            raise ValueError("No previous version to roll back to")
+        self.current, self.previous = self.previous, self.current
+        self.rejected = served_version(self.kind)
+        print(f"⚠️ Rolled back to version {self.current.version}")
+        return self.current
+
+    async def watch(self):
+        """Polls the kind's pointer and reloads when it names another version."""
+        while True:
+            await asyncio.sleep(self.interval)
+            version = served_version(self.kind)
+            if version is None or version in (self.current.version, self.rejected):
+                continue
+            await self.reload()
+
+    def status(self):
+        return {
+            "current": self.current.describe() if self.current else None,
+            "previous": self.previous.describe() if self.previous else None,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "reload_interval": self.interval,
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish trained classifier artifacts for serving.")
+    parser.add_argument("kind", choices=["forest", "engine", "cascade", "reduced"],
+                        help="Model kind whose saved artifacts are published with their transform file")
+    args = parser.parse_args()
+    publish(args.kind, PreprocessingTransform.load(artifact_paths(args.kind)[1]))
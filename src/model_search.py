@@ -0,0 +1,238 @@
+import os
+import json
+import math
+import time
+import hashlib
+import argparse
+import itertools
+import joblib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from src.model_training import DATA_FOLDER, MODEL_DIR, load_training_matrix, make_forest, matrix_paths, split_indices
+
+# 📌 Trial results are cached per (matrix, config, budget), so interrupted searches resume
+TRIAL_DIR = os.path.join(DATA_FOLDER, "search_trials")
+SEARCH_RESULT = os.path.join(MODEL_DIR, "forest_search.json")
+
+# 📌 Candidate forest configurations (full grid)
+SEARCH_SPACE = {
+    "n_estimators": [25, 50, 100, 200],
+    "max_depth": [None, 12, 24],
+    "min_samples_leaf": [1, 5],
+    "max_features": ["sqrt", 0.5],
+}
+
+MIN_ROWS = 10_000  # Training rows per trial in the first rung
+ETA = 3  # Each rung keeps the best 1/ETA configurations and trains on ETA times more rows
+VALIDATION_ROWS = 50_000  # Cap on the held-out validation subsample scored by every trial
+LATENCY_BATCH_SIZES = (1, 32)  # Request sizes whose predict latency is checked against the budget
+LATENCY_CALLS = 15  # Timed predict calls per batch size; the median is kept
+AMORTIZED_ROWS = 10_000  # Validation rows in the large predict call timed for the amortized per-flow cost
+TRIAL_VERSION = 3  # Bump whenever the recorded trial fields change, so cached trials are rerun
+
+# 📌 Matrices memory-mapped once per worker process
+_X = _y = None
+
+def _init_worker(x_path, y_path):
+    global _X, _y
+    _X = np.load(x_path, mmap_mode="r")
+    _y = np.load(y_path, mmap_mode="r")
+
+def candidate_configs(space=SEARCH_SPACE):
+    """Expands the search space into a list of parameter dicts."""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+def _stratified_subsample(idx, y, n, seed=42):
+    """Sorted stratified sample of `n` indices from `idx` (all of them if `n` covers `idx`)."""
+    if n >= len(idx):
+        return idx
+    try:
+        sample, _ = train_test_split(idx, train_size=n, random_state=seed, stratify=y[idx])
+    except ValueError:  # A class is too rare to stratify at this size
+        sample, _ = train_test_split(idx, train_size=n, random_state=seed)
+    return np.sort(sample)
+
+def _trial_key(matrix_key, params, rows):
+    payload = json.dumps({"matrix": matrix_key, "params": params, "rows": rows, "version": TRIAL_VERSION},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def _load_trial(key):
+    path = os.path.join(TRIAL_DIR, f"{key}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def _save_trial(key, result):
+    os.makedirs(TRIAL_DIR, exist_ok=True)
+    tmp_path = os.path.join(TRIAL_DIR, f"{key}.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(tmp_path, os.path.join(TRIAL_DIR, f"{key}.json"))
+
+def _model_path(key):
+    return os.path.join(TRIAL_DIR, f"{key}.pkl")
+
+def run_trial(params, fit_idx, val_idx, model_path):
+    """Fits one configuration on `fit_idx` and scores it on `val_idx` (runs in a worker).
+
+    The fitted forest is saved to `model_path` for `time_trial`, since latencies measured
+    here would depend on the trials fitting on the other cores.
+    """
+    X_fit, y_fit = _X[fit_idx], _y[fit_idx]
+    X_val, y_val = _X[val_idx], _y[val_idx]
+
+    clf = make_forest(params, n_jobs=1)
+    start = time.perf_counter()
+    clf.fit(X_fit, y_fit)
+    fit_seconds = time.perf_counter() - start
+
+    os.makedirs(TRIAL_DIR, exist_ok=True)
+    joblib.dump(clf, model_path)
+    return {
+        "params": params,
+        "rows": int(len(fit_idx)),
+        "accuracy": float(accuracy_score(y_val, clf.predict(X_val))),
+        "fit_seconds": fit_seconds,
+        "nodes": int(sum(tree.tree_.node_count for tree in clf.estimators_)),
+    }
+
+def time_trial(result, model_path, X_val):
+    """Adds the predict latencies of a trial's saved forest to its result (runs in the parent, one at a time)."""
+    clf = joblib.load(model_path)
+
+    # 🔹 Small requests are dominated by per-call overhead, which the amortized time hides
+    batch_latency = {}
+    for size in LATENCY_BATCH_SIZES:
+        batch = X_val[:size]
+        timings = []
+        for _ in range(LATENCY_CALLS):
+            start = time.perf_counter()
+            clf.predict(batch)
+            timings.append(time.perf_counter() - start)
+        batch_latency[str(size)] = float(np.median(timings) * 1e6)
+
+    batch = X_val[:AMORTIZED_ROWS]
+    start = time.perf_counter()
+    clf.predict(batch)
+    predict_seconds = time.perf_counter() - start
+    os.remove(model_path)
+
+    result.update({
+        "latency_us": max(batch_latency.values()),  # Slowest small-batch predict call
+        "batch_latency_us": batch_latency,
+        "amortized_us": predict_seconds / len(batch) * 1e6,  # Per-flow time of one large predict
+    })
+    return result
+
+def search(configs=None, min_rows=MIN_ROWS, eta=ETA, workers=None, latency_budget=None):
+    """Successive halving over forest configurations on growing stratified subsamples.
+
+    Every rung trains the surviving configurations on `eta` times more rows than the last
+    and keeps the most accurate 1/eta of them, until one configuration remains or the
+    rung uses the whole training split. Trials are fit in a process pool that memory-maps
+    the training matrix. Once a rung's fits are done, each forest is timed in this process
+    with the pool idle, and its result is cached on disk.
+    """
+    configs = configs or candidate_configs()
+    X, y, _ = load_training_matrix()
+    x_path, y_path, _ = matrix_paths()
+    matrix_key = os.path.basename(x_path)[2:-4]
+
+    # 🔹 Validation rows come from the training split, so the test split stays untouched
+    train_idx, _ = split_indices(y)
+    val_idx = _stratified_subsample(train_idx, y, min(VALIDATION_ROWS, len(train_idx) // 5))
+    pool_idx = np.setdiff1d(train_idx, val_idx)
+    X_val = X[val_idx]
+    del X
+
+    rungs = []
+    survivors = configs
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(x_path, y_path)) as pool:
+        rung = 0
+        while True:
+            rows = min(min_rows * eta ** rung, len(pool_idx))
+            fit_idx = _stratified_subsample(pool_idx, y, rows)
+
+            results, futures = {}, {}
+            for i, params in enumerate(survivors):
+                key = _trial_key(matrix_key, params, len(fit_idx))
+                cached = _load_trial(key)
+                if cached is not None:
+                    results[i] = cached
+                else:
+                    futures[pool.submit(run_trial, params, fit_idx, val_idx, _model_path(key))] = (i, key)
+            print(f"📌 Rung {rung}: {len(survivors)} configs on {len(fit_idx)} rows "
+                  f"({len(results)} cached, {len(futures)} to run)")
+
+            for future in as_completed(futures):
+                i, _ = futures[future]
+                results[i] = future.result()
+
+            # 🔹 Latency is timed one trial at a time while no other trial runs
+            for i, key in futures.values():
+                _save_trial(key, time_trial(results[i], _model_path(key), X_val))
+
+            ranked = sorted(results.values(), key=lambda r: (-r["accuracy"], r["latency_us"]))
+            rungs.append(ranked)
+            if len(ranked) == 1 or len(fit_idx) == len(pool_idx):
+                break
+            survivors = [r["params"] for r in ranked[:max(1, math.ceil(len(ranked) / eta))]]
+            rung += 1
+
+    best = select_config(rungs, latency_budget)
+    table = tradeoff_table(rungs)
+    print("📌 Time/accuracy tradeoff (each config at the largest rung it reached):")
+    print(table.to_string(index=False))
+    print(f"✅ Best config: {best['params']} (accuracy {best['accuracy']:.4f}, "
+          f"{best['latency_us']:.0f} µs per predict of up to {max(LATENCY_BATCH_SIZES)} flows)")
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with open(SEARCH_RESULT, "w") as f:
+        json.dump({
+            "best": best,
+            "latency_budget_us": latency_budget,
+            "table": table.to_dict(orient="records"),
+        }, f, indent=2, default=str)
+    print(f"✅ Search results saved to: {SEARCH_RESULT}")
+    return best
+
+def select_config(rungs, latency_budget=None):
+    """Most accurate config at the largest rung that has one within the latency budget.
+
+    The budget applies to a single predict call on each of `LATENCY_BATCH_SIZES` flows.
+    """
+    for ranked in reversed(rungs):
+        eligible = [r for r in ranked if latency_budget is None or r["latency_us"] <= latency_budget]
+        if eligible:
+            return eligible[0]
+    print(f"⚠️ No configuration meets the {latency_budget} µs latency budget, using the fastest one")
+    return min(rungs[-1], key=lambda r: r["latency_us"])
+
+def tradeoff_table(rungs):
+    """One row per configuration, from the largest rung it was evaluated at."""
+    rows = []
+    for rung, ranked in reversed(list(enumerate(rungs))):
+        for result in ranked:
+            if any(row["params"] == result["params"] for row in rows):
+                continue
+            rows.append({"rung": rung, **result})
+    table = pd.DataFrame(rows)
+    params = pd.DataFrame(list(table.pop("params")))
+    latency = pd.DataFrame(list(table.pop("batch_latency_us"))).add_prefix("latency_us_")
+    return pd.concat([params, table, latency], axis=1).round(
+        {"accuracy": 4, "fit_seconds": 2, "latency_us": 1, "amortized_us": 2, **dict.fromkeys(latency.columns, 1)})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving search over Random Forest configurations.")
+    parser.add_argument("--min-rows", type=int, default=MIN_ROWS, help="Training rows per trial in the first rung")
+    parser.add_argument("--eta", type=int, default=ETA, help="Halving factor between rungs")
+    parser.add_argument("--workers", type=int, default=None, help="Trial processes (defaults to all cores)")
+    parser.add_argument("--latency-budget", type=float, default=None, help="Predict latency budget in µs for a batch of 1 or 32 flows")
+    args = parser.parse_args()
+    search(min_rows=args.min_rows, eta=args.eta, workers=args.workers, latency_budget=args.latency_budget)
@@ -2,67 +2,420 @@ import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
+from sklearn.linear_model import SGDClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.neural_network import MLPClassifier
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
+import argparse
 import joblib
+import json
+import hashlib
 import os
+import time
+import pyarrow as pa
+from src.storage import ParquetTable, read_table, table_files
+from src.pipeline import file_hash
+from src.forest_engine import export_forest
+from src.model_registry import publish
+from src.transform import load_training_transform, promote_staged_transform
 
-# Load the dataset
-df = pd.read_csv("/Users/vidit/Downloads/AI_Threat_Analytics/processed_data/engineered_dataset.csv")
+# 📌 Define file paths
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "../processed_data")
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "../models")
 
-# Print available columns for debugging
-print("Available columns in dataset:", df.columns.tolist())
+input_file = os.path.join(DATA_FOLDER, "engineered_dataset.parquet")
+MATRIX_DIR = os.path.join(DATA_FOLDER, "training_matrix")  # float32 .npy cache, keyed by source hash
+MODEL_PATH = os.path.join(MODEL_DIR, "threat_classifier.pkl")
+INCREMENTAL_MODEL_PATH = os.path.join(MODEL_DIR, "threat_classifier_incremental.pkl")
 
-# Drop only columns that exist in the dataset
-columns_to_drop = ["Src IP", "Dst IP", "Timestamp"]
-existing_columns_to_drop = [col for col in columns_to_drop if col in df.columns]
+IDENTIFIER_COLUMNS = ["Src IP", "Dst IP", "Timestamp"]
+LABEL_BINS = 5  # Continuous labels are binned into this many classes
+STREAM_CHUNK_SIZE = 100_000  # Rows per partial_fit call for the out-of-core engines
+FAST_TRAIN_BUDGET = 200_000  # Training rows kept per class by the fast-train mode
 
-X = df.drop(columns=existing_columns_to_drop + ["Label"])  # Remove identifier columns
-y = df["Label"]
+def _prepare_labels(df):
+    """Extracts the Label column, binning it into classes if it is continuous."""
+    y = df["Label"]
 
-# Check unique values in Label column
-print("Unique values in Label column:", y.unique())
+    # Check unique values in Label column
+    print("Unique values in Label column:", y.unique())
 
-# Convert Label column to categorical if it's continuous
-if np.issubdtype(y.dtype, np.number):
+    # Convert Label column to categorical if it's continuous
+    if np.issubdtype(y.dtype, np.number):
+        print("Converting continuous labels to categorical...")
+        y = pd.cut(y, bins=LABEL_BINS, labels=False)  # Use pd.cut to ensure fixed bin counts
+
+    print("Labels after binning:", np.unique(y))
+    return np.asarray(y)
+
+def matrix_paths(path=input_file):
+    """Returns the cached X, y and metadata files for a dataset, keyed by its content hash."""
+    hashes = [file_hash(file) for file in table_files(path)]
+    key = hashes[0][:16] if len(hashes) == 1 else hashlib.sha256("".join(hashes).encode()).hexdigest()[:16]
+    return (os.path.join(MATRIX_DIR, f"X_{key}.npy"),
+            os.path.join(MATRIX_DIR, f"y_{key}.npy"),
+            os.path.join(MATRIX_DIR, f"meta_{key}.json"))
+
+def load_training_matrix(path=input_file):
+    """Returns memory-mapped float32 X, labels y and the feature names for a dataset.
+
+    The matrices are materialized as .npy files once per source file hash; later calls
+    memory-map them instead of re-reading the dataset.
+    """
+    x_path, y_path, meta_path = matrix_paths(path)
+
+    if not all(os.path.exists(p) for p in (x_path, y_path, meta_path)):
+        print(f"📌 Materializing training matrix from {path}")
+        df = read_table(path)
+
+        # Print available columns for debugging
+        print("Available columns in dataset:", df.columns.tolist())
+
+        # Drop only columns that exist in the dataset
+        columns_to_drop = IDENTIFIER_COLUMNS
+        existing_columns_to_drop = [col for col in columns_to_drop if col in df.columns]
+
+        X = df.drop(columns=existing_columns_to_drop + ["Label"])  # Remove identifier columns
+        y = _prepare_labels(df)
+
+        os.makedirs(MATRIX_DIR, exist_ok=True)
+        np.save(x_path, X.to_numpy(dtype=np.float32))
+        np.save(y_path, y)
+        with open(meta_path, "w") as f:
+            json.dump({"source": os.path.abspath(path), "features": X.columns.tolist()}, f, indent=2)
+        del df, X, y
+    else:
+        print(f"📌 Reusing cached training matrix {os.path.basename(x_path)}")
+
+    with open(meta_path) as f:
+        features = json.load(f)["features"]
+    return np.load(x_path, mmap_mode="r"), np.load(y_path, mmap_mode="r"), features
+
+def split_indices(y, test_size=0.2):
+    """Sorted row indices of the stratified train/test split."""
+    if len(np.unique(y)) < 2:
+        raise ValueError("Only one class present after binning. Adjust binning strategy.")
+    train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=test_size, random_state=42, stratify=y)
+    return np.sort(train_idx), np.sort(test_idx)  # Sorted for sequential reads from the memory map
+
+def split_training_matrix(X, y, test_size=0.2):
+    """Stratified train/test split that only copies the selected rows out of the memory map."""
+    train_idx, test_idx = split_indices(y, test_size)
+    return X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+
+def evaluate(clf, X_test, y_test):
+    """Prints the evaluation report and returns the test accuracy."""
+    # Make predictions
+    y_pred = clf.predict(X_test)
+
+    # Evaluate the model
+    if len(np.unique(y_test)) > 1:
+        print("Model Evaluation:")
+        print(confusion_matrix(y_test, y_pred))
+        print(classification_report(y_test, y_pred))
+    else:
+        print("Warning: Model is predicting only one class. Check label processing.")
+
+    accuracy = accuracy_score(y_test, y_pred)
+    print(f"Accuracy: {accuracy:.4f}")
+    return accuracy
+
+def save_model(obj, path):
+    """Pickles a model through a temporary file, so a serving process never reads a partial artifact."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+def make_forest(params=None, n_jobs=-1):
+    """The threat classifier's Random Forest, with `params` overriding the default configuration."""
+    params = {"n_estimators": 100, **(params or {})}
+    return RandomForestClassifier(**params, random_state=42, class_weight="balanced", n_jobs=n_jobs)
+
+def balanced_subsample(y, budget, seed=42):
+    """Keeps at most `budget` rows per class, with weights that correct for the sampling.
+
+    Each kept row is weighted by its inverse sampling probability times the class weight
+    `class_weight="balanced"` would give its class on the full data, so the forest sees the
+    same class balance as a full-data fit. Classes under the budget are kept entirely.
+    """
+    rng = np.random.default_rng(seed)
+    classes, counts = np.unique(y, return_counts=True)
+    rows, weights = [], []
+    for c, count in zip(classes, counts):
+        members = np.flatnonzero(y == c)
+        if count > budget:
+            members = np.sort(rng.choice(members, budget, replace=False))
+        rows.append(members)
+        weights.append(np.full(len(members), count / len(members) * len(y) / (len(classes) * count)))
+    rows, weights = np.concatenate(rows), np.concatenate(weights)
+    order = np.argsort(rows)  # Sequential reads from the memory map
+    return rows[order], weights[order]
+
+def compare_reports(y_test, predictions):
+    """Per-class precision, recall and F1 of several models side by side."""
+    frames = {}
+    for name, y_pred in predictions.items():
+        report = classification_report(y_test, y_pred, output_dict=True, zero_division=0)
+        frames[name] = pd.DataFrame(report).T[["precision", "recall", "f1-score"]]
+    return pd.concat(frames, axis=1).drop(index="accuracy", errors="ignore").round(4)
+
+def train_model(n_jobs=-1, params=None, fast_budget=None, compare=False):
+    """Trains, evaluates and saves the Random Forest threat classifier.
+
+    `params` overrides the forest configuration, e.g. with the result of a search. With
+    `fast_budget`, the forest is fit on a class-balanced subsample of at most that many rows
+    per class; `compare` then also fits a full-data model and reports both side by side.
+    The forest and its compiled engine are published for serving with the transform of the data.
+    """
+    transform = load_training_transform()  # Read with the data, so it matches what the forest is fit on
+    X, y, features = load_training_matrix()
+
+    # Split the data into training and testing sets
+    try:
+        X_train, X_test, y_train, y_test = split_training_matrix(X, y)
+    except ValueError as e:
+        print(f"Warning: {e}")
+        return None
+
+    # Check Train-Test Distribution
+    print("y_train class distribution:\n", pd.Series(y_train).value_counts())
+    print("y_test class distribution:\n", pd.Series(y_test).value_counts())
+
+    # Train the model
+    clf = make_forest(params, n_jobs)
+    print(f"Training the Random Forest Classifier with {clf.get_params()['n_estimators']} trees...")
+    start = time.perf_counter()
+    if fast_budget:
+        rows, weights = balanced_subsample(y_train, fast_budget)
+        print(f"Fast train on {len(rows)} of {len(y_train)} rows (at most {fast_budget} per class)")
+        clf.set_params(class_weight=None)  # The sample weights already balance the classes
+        clf.fit(X_train[rows], y_train[rows], sample_weight=weights)
+    else:
+        clf.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    print(f"Training took {fit_seconds:.1f} s")
+
+    accuracy = evaluate(clf, X_test, y_test)
+
+    if fast_budget and compare:
+        print("Training a full-data model for comparison...")
+        full = make_forest(params, n_jobs)
+        start = time.perf_counter()
+        full.fit(X_train, y_train)
+        full_seconds = time.perf_counter() - start
+        y_full = full.predict(X_test)
+        print(compare_reports(y_test, {"fast": clf.predict(X_test), "full": y_full}))
+        print(f"📌 Fast: accuracy {accuracy:.4f} in {fit_seconds:.1f} s | "
+              f"Full: accuracy {accuracy_score(y_test, y_full):.4f} in {full_seconds:.1f} s "
+              f"({full_seconds / fit_seconds:.1f}x slower)")
+        del full
+
+    # Save the trained model
+    save_model(clf, MODEL_PATH)
+    print("Model saved successfully: ../models/threat_classifier.pkl")
+    promote_staged_transform()
+
+    # Compile the forest for fast inference, checking parity on the held-out split
+    export_forest(clf, X_test)
+
+    if transform is not None:
+        publish("forest", transform)
+        publish("engine", transform)
+    else:
+        print("⚠️ No preprocessing transform found, the model was saved but not published for serving")
+    return clf
+
+# 📌 Out-of-core engines: classifiers that learn from one chunk at a time with partial_fit
+def _make_incremental_model(engine):
+    if engine == "sgd":
+        return SGDClassifier(loss="log_loss", alpha=1e-5, random_state=42)
+    if engine == "nb":
+        return GaussianNB()
+    if engine == "mlp":
+        return MLPClassifier(hidden_layer_sizes=(64, 32), random_state=42)
+    raise ValueError(f"❌ Unknown incremental engine: {engine}")
+
+def _label_spec(parquet):
+    """Streams the Label column once to fix the classes, binning numeric labels like `_prepare_labels`."""
+    labels = (batch.column(0).to_numpy(zero_copy_only=False)
+              for batch in parquet.iter_batches(columns=["Label"]))
+    label_type = parquet.schema_arrow.field("Label").type
+    if not (pa.types.is_integer(label_type) or pa.types.is_floating(label_type)):
+        classes = sorted(set().union(*(np.unique(values.astype(str)) for values in labels)))
+        return {"edges": None, "classes": np.asarray(classes)}
+
+    low, high = np.inf, -np.inf
+    for values in labels:
+        low, high = min(low, np.nanmin(values)), max(high, np.nanmax(values))
+    # Same edges as pd.cut with an integer number of bins
+    if low == high:
+        low, high = low - (0.001 * abs(low) or 0.001), high + (0.001 * abs(high) or 0.001)
+        edges = np.linspace(low, high, LABEL_BINS + 1)
+    else:
+        edges = np.linspace(low, high, LABEL_BINS + 1)
+        edges[0] -= (high - low) * 0.001
     print("Converting continuous labels to categorical...")
-    y = pd.cut(y, bins=5, labels=False)  # Use pd.cut to ensure fixed bin counts
+    return {"edges": edges, "classes": np.arange(LABEL_BINS)}
+
+def _encode_labels(values, spec):
+    """Maps raw labels to class codes 0..k-1; unknown non-numeric labels become -1."""
+    if spec["edges"] is None:
+        codes = np.searchsorted(spec["classes"], values.astype(str))
+        codes = np.minimum(codes, len(spec["classes"]) - 1)
+        return np.where(spec["classes"][codes] == values.astype(str), codes, -1)
+    codes = np.searchsorted(spec["edges"], values, side="left") - 1
+    return np.clip(codes, 0, len(spec["classes"]) - 1)  # Labels beyond the fitted range join the end bins
+
+def _holdout_mask(codes, seen, test_size):
+    """Marks `test_size` of each class's rows, in arrival order, as holdout (updates `seen`).
+
+    Assignment depends only on a row's position among the rows of its class, so the split is
+    stratified without a shuffle and identical on every pass, whatever the chunk size.
+    """
+    mask = np.zeros(len(codes), dtype=bool)
+    for c in np.unique(codes[codes >= 0]):
+        rows = np.flatnonzero(codes == c)
+        ordinal = seen[c] + np.arange(len(rows))
+        mask[rows] = np.floor((ordinal + 1) * test_size) > np.floor(ordinal * test_size)
+        seen[c] += len(rows)
+    return mask
+
+def _iter_rows(parquet, columns, chunk_size, start_row=0):
+    """Yields DataFrame chunks of `columns` for the rows from `start_row` on, skipping earlier row groups."""
+    offsets = np.cumsum([0] + [parquet.row_group_rows(i) for i in range(parquet.num_row_groups)])
+    row_groups = [i for i in range(parquet.num_row_groups) if offsets[i + 1] > start_row]
+    skip = start_row - offsets[row_groups[0]] if row_groups else 0
+    for batch in parquet.iter_batches(batch_size=chunk_size, row_groups=row_groups, columns=columns):
+        frame = batch.to_pandas()
+        if skip:
+            frame, skip = frame.iloc[skip:], max(0, skip - len(frame))
+        if not frame.empty:
+            yield frame
+
+def _iter_labeled_chunks(parquet, features, spec, chunk_size, start_row=0):
+    """Yields (X, codes) chunks of the rows from `start_row` on, reading only the needed columns."""
+    for frame in _iter_rows(parquet, features + ["Label"], chunk_size, start_row):
+        X = np.nan_to_num(frame[features].to_numpy(dtype=np.float32), posinf=0.0, neginf=0.0)
+        yield X, _encode_labels(frame["Label"].to_numpy(), spec)
+
+def train_incremental(engine="sgd", epochs=1, chunk_size=STREAM_CHUNK_SIZE, update=False, path=input_file,
+                      test_size=0.2):
+    """Trains a partial_fit classifier on the engineered dataset chunk by chunk, in bounded memory.
+
+    Rows are split into train and holdout per class as they stream in. With `update`, the
+    saved model continues from where it stopped and learns only from rows appended since.
+    """
+    parquet = ParquetTable(path)  # Includes the rows appended by src.incremental
+    if update:
+        state = joblib.load(INCREMENTAL_MODEL_PATH)
+        engine, epochs = state["engine"], 1
+        print(f"📌 Updating the {engine} model with rows after {state['rows']}")
+    else:
+        features = [col for col in parquet.schema_arrow.names if col not in IDENTIFIER_COLUMNS + ["Label"]]
+        spec = _label_spec(parquet)
+        state = {"engine": engine, "model": _make_incremental_model(engine), "features": features,
+                 "labels": spec, "seen": np.zeros(len(spec["classes"]), dtype=np.int64),
+                 "counts": np.zeros(len(spec["classes"]), dtype=np.int64), "rows": 0}
+    model, features, spec = state["model"], state["features"], state["labels"]
+    classes = np.arange(len(spec["classes"]))
+    start_row = state["rows"]
 
-print("Labels after binning:", np.unique(y))
+    # 🔹 Class-balanced sample weights from the label counts, like class_weight="balanced"
+    counts = state["counts"].copy()
+    for frame in _iter_rows(parquet, ["Label"], chunk_size, start_row):
+        codes = _encode_labels(frame["Label"].to_numpy(), spec)
+        counts += np.bincount(codes[codes >= 0], minlength=len(classes))
+    weights = np.divide(counts.sum(), len(classes) * counts, out=np.zeros(len(classes)), where=counts > 0)
 
-# Split the data into training and testing sets
-if len(np.unique(y)) > 1:
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-else:
-    print("Warning: Only one class present after binning. Adjust binning strategy.")
-    exit()
+    # 🔹 Stream the training rows through partial_fit
+    rng = np.random.default_rng(42)
+    for epoch in range(epochs):
+        seen, trained = state["seen"].copy(), 0
+        for X, codes in _iter_labeled_chunks(parquet, features, spec, chunk_size, start_row):
+            train = ~_holdout_mask(codes, seen, test_size) & (codes >= 0)
+            order = rng.permutation(np.flatnonzero(train))  # Captures arrive in time order
+            if len(order):
+                model.partial_fit(X[order], codes[order], classes=classes, sample_weight=weights[codes[order]])
+                trained += len(order)
+        print(f"📌 Epoch {epoch + 1}/{epochs}: trained on {trained} rows")
+    state["seen"], state["counts"] = seen, counts
+    state["rows"] = parquet.num_rows
 
-# Check Train-Test Distribution
-print("y_train class distribution:\n", pd.Series(y_train).value_counts())
-print("y_test class distribution:\n", pd.Series(y_test).value_counts())
+    evaluate_streaming(model, parquet, features, spec, chunk_size, test_size)
 
-# Train the model
-print("Training the Random Forest Classifier...")
-clf = RandomForestClassifier(n_estimators=100, random_state=42, class_weight="balanced")
-clf.fit(X_train, y_train)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    joblib.dump(state, INCREMENTAL_MODEL_PATH)
+    print(f"✅ Incremental {engine} model saved to: {INCREMENTAL_MODEL_PATH}")
+    return model
 
-# Make predictions
-y_pred = clf.predict(X_test)
+def evaluate_streaming(model, parquet, features, spec, chunk_size, test_size=0.2):
+    """Accumulates the confusion matrix over the holdout rows chunk by chunk and prints the report."""
+    k = len(spec["classes"])
+    matrix = np.zeros((k, k), dtype=np.int64)
+    seen = np.zeros(k, dtype=np.int64)
+    for X, codes in _iter_labeled_chunks(parquet, features, spec, chunk_size):
+        holdout = _holdout_mask(codes, seen, test_size) & (codes >= 0)
+        if holdout.any():
+            matrix += confusion_matrix(codes[holdout], model.predict(X[holdout]), labels=np.arange(k))
 
-# Evaluate the model
-if len(np.unique(y_test)) > 1:
     print("Model Evaluation:")
-    print(confusion_matrix(y_test, y_pred))
-    print(classification_report(y_test, y_pred))
-else:
-    print("Warning: Model is predicting only one class. Check label processing.")
+    print(matrix)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        report = pd.DataFrame({
+            "precision": np.diag(matrix) / matrix.sum(axis=0),
+            "recall": np.diag(matrix) / matrix.sum(axis=1),
+            "support": matrix.sum(axis=1),
+        }, index=spec["classes"]).fillna(0.0)
+    print(report.round(4))
+    accuracy = np.trace(matrix) / max(matrix.sum(), 1)
+    print(f"Accuracy: {accuracy:.4f}")
+    return accuracy
 
-print(f"Accuracy: {accuracy_score(y_test, y_pred):.4f}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the threat classifier.")
+    parser.add_argument("--engine", choices=["forest", "sgd", "nb", "mlp"], default="forest",
+                        help="forest trains in memory; sgd, nb and mlp stream the dataset through partial_fit")
+    parser.add_argument("--epochs", type=int, default=1, help="Passes over the data for the streaming engines")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE, help="Rows per partial_fit call")
+    parser.add_argument("--update", action="store_true",
+                        help="Continue the saved streaming model on rows appended since its last run")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel jobs for training (-1 uses all cores)")
+    parser.add_argument("--search", action="store_true",
+                        help="Run a successive-halving search first and train the best configuration")
+    parser.add_argument("--config", default=None, help="Train with the best configuration of a saved search")
+    parser.add_argument("--latency-budget", type=float, default=None, help="Predict latency budget (µs) for a batch of 1 or 32 flows, for --search")
+    parser.add_argument("--fast", action="store_true",
+                        help="Fit on a class-balanced subsample with correcting sample weights")
+    parser.add_argument("--budget", type=int, default=FAST_TRAIN_BUDGET, help="Rows kept per class by --fast")
+    parser.add_argument("--compare", action="store_true", help="With --fast, also fit a full-data model and compare")
+    parser.add_argument("--reduce", action="store_true",
+                        help="Retrain on the top-k most important features and save a reduced model")
+    parser.add_argument("--top-k", type=int, nargs="+", default=None, help="Feature counts tried by --reduce")
+    parser.add_argument("--max-drop", type=float, default=None, help="Accuracy loss accepted by --reduce or --cascade")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Train a shallow first-stage tree that answers confident flows before the forest")
+    args = parser.parse_args()
 
-# Ensure the directory exists before saving the model
-model_dir = os.path.join(os.path.dirname(__file__), "../models")
-os.makedirs(model_dir, exist_ok=True)
+    if args.update or args.engine != "forest":
+        train_incremental(args.engine, epochs=args.epochs, chunk_size=args.chunk_size, update=args.update)
+    else:
+        params = None
+        if args.search:
+            from src.model_search import search
+            params = search(latency_budget=args.latency_budget)["params"]
+        elif args.config:
+            with open(args.config) as f:
+                params = json.load(f)["best"]["params"]
 
-# Save the trained model
-joblib.dump(clf, os.path.join(model_dir, "threat_classifier.pkl"))
-print("Model saved successfully: ../models/threat_classifier.pkl")
\ No newline at end of file
+        if args.cascade:
+            from src.cascade import train_cascade, MAX_ACCURACY_DROP
+            train_cascade(args.n_jobs, params, max_drop=MAX_ACCURACY_DROP if args.max_drop is None else args.max_drop)
+        elif args.reduce:
+            from src.model_reduction import reduce_model, TOP_K, MAX_ACCURACY_DROP
+            reduce_model(args.top_k or TOP_K, MAX_ACCURACY_DROP if args.max_drop is None else args.max_drop,
+                         n_jobs=args.n_jobs, params=params)
+        else:
+            train_model(n_jobs=args.n_jobs, params=params, fast_budget=args.budget if args.fast else None,
+                        compare=args.compare)
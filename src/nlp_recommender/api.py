@@ -1,17 +1,25 @@
+import contextlib
 from fastapi import APIRouter
-from src.nlp_recommender.recommendation_engine import ThreatMitigationRecommender
-import os
-knowledge_base_path = os.path.join(os.path.dirname(__file__), "../../processed_data/cicids_mitigations_kb.json")
+from src.nlp_recommender import workers
 
-router = APIRouter()
-recommender = ThreatMitigationRecommender(knowledge_base_path=knowledge_base_path)
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    workers.shutdown()
+
+router = APIRouter(lifespan=lifespan)
 
 @router.post("/recommend")
-def recommend_threat_mitigation(threat: dict):
+async def recommend_threat_mitigation(threat: dict):
     """
     Takes threat info and returns a full NLP-generated mitigation report.
     """
-    context = threat.get("context", None)
-    recommendations = recommender.generate_recommendations(threat, context)
-    report = recommender.generate_report(recommendations)
-    return {"report": report}
\ No newline at end of file
+    report = await workers.submit(workers.recommend, threat)
+    return {"report": report}
+
+@router.get("/stats")
+async def recommender_stats():
+    """
+    Execution backend, jobs pending and completed, and jobs refused with 429.
+    """
+    return dict(workers.pool.status(), **(workers.pool.value.status() if workers.pool.state == "ready" else {}))
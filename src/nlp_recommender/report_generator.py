@@ -2,6 +2,7 @@ import json
 import datetime
 import random
 from jinja2 import Template
+from fastapi import APIRouter, HTTPException
 
 class NLGReportGenerator:
     def __init__(self):
@@ -329,6 +330,24 @@ These recommendations can be implemented as part of regular security maintenance
         
         return filename
 
+# 📌 Report rendering endpoint; reports are rendered by the recommender workers
+router = APIRouter()
+
+@router.post("/generate")
+async def generate_security_report(request: dict):
+    """
+    Renders a recommendation object (as returned by the recommender) into a natural language report.
+    """
+    from src.nlp_recommender import workers
+
+    if "recommendation" not in request:
+        raise HTTPException(status_code=422, detail="Send {\"recommendation\": {...}, \"context\": {...}}")
+    try:
+        report = await workers.submit(workers.render_report, request["recommendation"], request.get("context"))
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=f"Recommendation is missing {e}")
+    return {"report": report}
+
 # Example usage
 if __name__ == "__main__":
     # Initialize report generator
@@ -0,0 +1,126 @@
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from src.subsystems import LazyResource
+
+# 📌 Recommendations and reports are computed off the event loop, in worker processes by default
+BACKEND = os.environ.get("RECOMMEND_BACKEND", "process")  # process or thread
+WORKERS = int(os.environ.get("RECOMMEND_WORKERS", min(os.cpu_count() or 1, 4)))  # Each process holds its own spaCy model
+MAX_PENDING = int(os.environ.get("RECOMMEND_MAX_PENDING", 4 * WORKERS))  # Queued plus running jobs before answering 429
+KNOWLEDGE_BASE_PATH = os.path.join(os.path.dirname(__file__), "../../processed_data/cicids_mitigations_kb.json")
+
+# 📌 Loaded once per worker process (once per server with the thread backend)
+_recommender = _report_generator = None
+_init_error = None
+
+def _init_worker(knowledge_base_path):
+    global _recommender, _report_generator, _init_error
+    _init_error = None
+    try:
+        from src.nlp_recommender.recommendation_engine import ThreatMitigationRecommender
+        from src.nlp_recommender.report_generator import NLGReportGenerator
+        _recommender = ThreatMitigationRecommender(knowledge_base_path=knowledge_base_path)
+        _report_generator = NLGReportGenerator()
+    except Exception as e:  # Reported through _ping: a raising initializer would only break the pool
+        _init_error = f"{type(e).__name__}: {e}"
+
+def _ping(_):
+    time.sleep(0.05)  # Keeps this worker busy so that the other pings reach the other workers
+    return os.getpid(), _init_error
+
+def recommend(threat):
+    """Mitigation report for a detected threat (runs in a worker)."""
+    context = threat.get("context", None)
+    recommendations = _recommender.generate_recommendations(threat, context)
+    return _recommender.generate_report(recommendations)
+
+def render_report(recommendation, context=None):
+    """Natural language report for a recommendation object (runs in a worker)."""
+    return _report_generator.generate_report(recommendation, context)
+
+class WorkerPool:
+    """An executor whose workers have preloaded the recommender and report generator.
+
+    Jobs queue on the executor until `max_pending` are queued or running; further jobs are
+    refused, so a burst of heavy requests cannot build an unbounded backlog.
+    """
+
+    def __init__(self, backend=BACKEND, workers=WORKERS, max_pending=MAX_PENDING,
+                 knowledge_base_path=KNOWLEDGE_BASE_PATH):
+        self.backend = backend
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.stats = {"completed": 0, "rejected": 0}
+
+        if backend == "process":
+            # Spawned workers start clean instead of forking the server's threads
+            self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=_init_worker, initargs=(knowledge_base_path,))
+            self._wait_for_workers()
+        elif backend == "thread":
+            _init_worker(knowledge_base_path)
+            if _init_error:
+                raise RuntimeError(_init_error)
+            self.executor = ThreadPoolExecutor(workers)
+        else:
+            raise ValueError(f"❌ Unknown recommender backend: {backend}")
+
+    def _wait_for_workers(self, rounds=20):
+        """Blocks until every worker process has run its initializer; raises its error if it failed."""
+        pids = set()
+        for _ in range(rounds):
+            for pid, error in self.executor.map(_ping, range(self.workers)):
+                if error:
+                    self.close()
+                    raise RuntimeError(error)
+                pids.add(pid)
+            if len(pids) == self.workers:
+                return
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise HTTPException(status_code=429, detail=f"{self.pending} recommendation jobs pending, retry later",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.pending -= 1
+        self.stats["completed"] += 1
+        return result
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def status(self):
+        return dict(self.stats, backend=self.backend, workers=self.workers, pending=self.pending,
+                    max_pending=self.max_pending)
+
+pool = LazyResource("recommender", WorkerPool)
+
+async def submit(fn, *args):
+    """Runs `fn(*args)` on the worker pool: 503 until the pool is up, 429 while it is saturated."""
+    if pool.state != "ready":
+        pool.warm()  # First use without a startup warm-up, or a retry after a failed load
+        raise HTTPException(status_code=503, detail=f"Recommender is {pool.state}" +
+                            (f": {pool.error}" if pool.error else ""), headers={"Retry-After": "5"})
+    current = pool.value
+    try:
+        return await current.run(fn, *args)
+    except BrokenExecutor:
+        # A worker died (e.g. out of memory); restart the pool in the background, once
+        if pool.value is current:
+            current.close()
+            pool.reset()
+            pool.warm()
+        raise HTTPException(status_code=503, detail="Recommender workers crashed, restarting")
+
+def shutdown():
+    if pool.state == "ready":
+        pool.value.close()
+        pool.reset()
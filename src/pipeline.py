@@ -0,0 +1,166 @@
+import os
+import json
+import copy
+import shutil
+import hashlib
+import argparse
+from src import data_preprocessing, feature_engineering, storage, window_features
+from src import transform as transform_module
+from src.storage import drop_parts, read_table, write_table
+from src.transform import PreprocessingTransform, TRANSFORM_PATH, drop_staged_transform
+
+# 📌 Stage outputs are cached by content, so unchanged stages are skipped on re-runs
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "../processed_data/cache")
+HASH_INDEX = os.path.join(CACHE_DIR, "file_hashes.json")
+
+def file_hash(path):
+    """Returns the SHA-256 of a file, memoized by path, size and modification time."""
+    stat = os.stat(path)
+    memo_key = f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    index = {}
+    if os.path.exists(HASH_INDEX):
+        with open(HASH_INDEX) as f:
+            index = json.load(f)
+    if memo_key in index:
+        return index[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+    index[memo_key] = digest.hexdigest()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(HASH_INDEX, "w") as f:
+        json.dump(index, f, indent=2)
+    return index[memo_key]
+
+class Stage:
+    """A pipeline stage whose cache key covers its inputs, its source code and its parameters."""
+
+    def __init__(self, name, modules, run, output, deps=(), input_files=(), params=None):
+        self.name = name
+        self.modules = modules  # Source of these modules is the stage's code version
+        self.run = run  # run(inputs, transform) -> DataFrame
+        self.output = output  # Published location of the stage output
+        self.deps = list(deps)
+        self.input_files = list(input_files)
+        self.params = params or {}
+
+    def key(self, dep_keys):
+        code = hashlib.sha256()
+        for module in self.modules:
+            with open(module.__file__, "rb") as f:
+                code.update(f.read())
+        code_version = code.hexdigest()
+        payload = json.dumps({
+            "stage": self.name,
+            "inputs": [file_hash(path) for path in self.input_files] + [dep_keys[dep] for dep in self.deps],
+            "code": code_version,
+            "params": self.params,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def cache_paths(self, key):
+        base = os.path.join(CACHE_DIR, f"{self.name}-{key}")
+        return f"{base}.parquet", f"{base}.transform.pkl"
+
+def _run_clean(inputs, transform):
+    return data_preprocessing.load_and_preprocess_data(transform=transform)
+
+def _run_features(inputs, transform):
+    return feature_engineering.engineer_features(inputs[0], transform)
+
+# 📌 Stages in topological order
+SHARED_MODULES = [storage, transform_module]  # Every stage writes its table and transform through these
+
+STAGES = [
+    Stage(
+        "clean", [data_preprocessing, *SHARED_MODULES], _run_clean,
+        output=data_preprocessing.output_file,
+        input_files=[data_preprocessing.input_file],
+        params={
+            "schema_sample_rows": data_preprocessing.SCHEMA_SAMPLE_ROWS,
+            "category_max_unique_ratio": data_preprocessing.CATEGORY_MAX_UNIQUE_RATIO,
+        },
+    ),
+    Stage(
+        "features", [feature_engineering, window_features, *SHARED_MODULES], _run_features,
+        output=feature_engineering.output_file,
+        deps=["clean"],
+        params={
+            "drop_cols": feature_engineering.DROP_COLS,
+            "engineered_features": feature_engineering.ENGINEERED_FEATURES,
+            "host_windows": window_features.HOST_WINDOWS,
+        },
+    ),
+]
+
+def _publish(src, dst):
+    """Copies a cache entry to its published location.
+
+    Published files are rewritten in place by the standalone stage scripts, so they must not
+    share an inode with the cache entry, which would then no longer match its key.
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    drop_parts(dst)  # Rows appended to the previous output (src.incremental) are superseded
+    shutil.copyfile(src, f"{dst}.tmp")
+    os.replace(f"{dst}.tmp", dst)
+
+def run_pipeline(stages=STAGES, force=False):
+    """Runs the stages whose cache entries are missing and publishes every stage output."""
+    by_name = {stage.name: stage for stage in stages}
+    keys = {}
+    for stage in stages:
+        keys[stage.name] = stage.key(keys)
+
+    def cached(stage):
+        return not force and all(os.path.exists(path) for path in stage.cache_paths(keys[stage.name]))
+
+    # 🔹 Walk back from the last stage: a stage runs only if its output is needed and not cached
+    to_run, pending = set(), [stages[-1].name]
+    while pending:
+        name = pending.pop()
+        if name in to_run or cached(by_name[name]):
+            continue
+        to_run.add(name)
+        pending.extend(by_name[name].deps)
+
+    results, transforms = {}, {}
+    for stage in stages:
+        data_path, transform_path = stage.cache_paths(keys[stage.name])
+        if stage.name not in to_run:
+            print(f"⏭️ Stage '{stage.name}' is up to date ({keys[stage.name]})")
+            continue
+
+        print(f"📌 Running stage '{stage.name}' ({keys[stage.name]})")
+        inputs = []
+        transform = PreprocessingTransform()
+        for dep in stage.deps:
+            dep_data, dep_transform = by_name[dep].cache_paths(keys[dep])
+            inputs.append(results[dep] if dep in results else read_table(dep_data))
+            transform = copy.deepcopy(transforms[dep]) if dep in transforms else PreprocessingTransform.load(dep_transform)
+
+        # Results stay in memory so downstream stages skip re-reading them
+        results[stage.name] = stage.run(inputs, transform)
+        transforms[stage.name] = transform
+        write_table(results[stage.name], data_path)
+        transform.save(transform_path)
+
+    # 🔹 Publish the outputs and the transform of the final stage
+    for stage in stages:
+        data_path = stage.cache_paths(keys[stage.name])[0]
+        if os.path.exists(data_path):
+            _publish(data_path, stage.output)
+    final_transform = stages[-1].cache_paths(keys[stages[-1].name])[1]
+    _publish(final_transform, TRANSFORM_PATH)
+    drop_staged_transform()
+    print(f"✅ Pipeline complete! Engineered data at {stages[-1].output}")
+    return keys
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run preprocessing and feature engineering with stage caching.")
+    parser.add_argument("--force", action="store_true", help="Ignore cached stage outputs and rebuild everything")
+    args = parser.parse_args()
+    run_pipeline(force=args.force)
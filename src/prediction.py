@@ -1,71 +1,473 @@
 import pandas as pd
-from prophet import Prophet
+import io
 import os
-import matplotlib.pyplot as plt
+import re
+import json
+import time
+import argparse
+import datetime
+import asyncio
+import hashlib
+import contextlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+from src.storage import read_table
+from src.count_cube import SOURCE, update_cube
+from src.subsystems import LazyResource
 
-# Load the dataset
-df = pd.read_csv("/Users/vidit/Downloads/AI_Threat_Analytics/processed_data/merged_dataset.csv")
-print(f"Loaded dataset with {len(df)} rows.")
+# 📌 Forecasting runs as a batch job (python -m src.prediction); importing this module only
+# defines it, and Prophet is imported when a model is fitted
+input_file = SOURCE  # Merged dataset with Timestamp and Label columns
+output_dir = os.path.join(os.path.dirname(__file__), "../forecasts")
+FORECAST_PERIODS = 30  # Days forecast past the end of the data
 
-# Ensure required columns exist
-if 'Timestamp' not in df.columns or 'Label' not in df.columns:
-    raise ValueError("Dataset must contain 'Timestamp' and 'Label' columns.")
+# 📌 Every label's forecast goes into one columnar file, with a JSON summary of the run
+FORECAST_FILE = "forecasts.parquet"  # label, ds, yhat, yhat_lower, yhat_upper, y (observed, empty for future days)
+SUMMARY_FILE = "run_summary.json"
+MODEL_STATE_FILE = "model_state.json"  # Per label: watermark of the fitted series and Prophet parameters
+BACKENDS = ("prophet", "holt-winters")  # Prophet for rich daily models, Holt-Winters for fast fine-grained ones
+MODEL_VERSION = 1  # Bump when the Prophet settings change, so that every label is refitted
 
-# Convert Timestamp to datetime
-df['Timestamp'] = pd.to_datetime(df['Timestamp'], errors='coerce')
-df = df.dropna(subset=['Timestamp'])  # Drop rows with invalid timestamps
-print(f"Remaining rows after cleaning timestamps: {len(df)}")
+# 📌 Forecast serving (overridable through the environment)
+REFRESH_INTERVAL = float(os.environ.get("FORECAST_REFRESH_INTERVAL", 5.0))  # Seconds between checks for new forecasts
+RESPONSE_CACHE_SIZE = 256  # Encoded responses kept per forecast version
+TOTAL_LABEL = "ALL"  # Label under which the total number of attacks per day is forecast
 
-# Forecast total number of attacks per day
-df['Date'] = df['Timestamp'].dt.date
-daily_attacks = df.groupby('Date').size().reset_index(name='y')
-daily_attacks.rename(columns={'Date': 'ds'}, inplace=True)
+def daily_series(cube):
+    """Flows per day in total and for each label, as Prophet (ds, y) frames keyed by label.
 
-print(f"Number of unique dates: {daily_attacks['ds'].nunique()}")
-if len(daily_attacks) < 2:
-    raise ValueError("Not enough data for time series forecasting. Ensure the dataset spans multiple dates.")
+    A label's series only holds the days it was seen on.
+    """
+    series = {TOTAL_LABEL: cube.series(freq="D")}
+    for label in cube.labels:
+        series[label] = cube.series(label, freq="D")
+    return series
 
-# Train Prophet model
-model = Prophet()
-model.fit(daily_attacks)
+def series_key(series, periods):
+    """Watermark of a label's training data: changes whenever a count or the horizon does."""
+    digest = hashlib.sha256(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes())
+    digest.update(f"{periods}:{MODEL_VERSION}".encode())
+    return digest.hexdigest()[:16]
 
-# Make future dataframe
-future = model.make_future_dataframe(periods=30)
-forecast = model.predict(future)
+def warm_start_params(model):
+    """Fitted Prophet parameters, as JSON-serializable initial values for the next fit."""
+    params = {name: float(model.params[name][0][0]) for name in ("k", "m", "sigma_obs")}
+    params.update({name: model.params[name][0].tolist() for name in ("delta", "beta")})
+    return params
 
-# Create forecast directory
-output_dir = os.path.join(os.path.dirname(__file__), "../forecasts")
-os.makedirs(output_dir, exist_ok=True)
-
-# Save and plot forecast
-forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].to_csv(os.path.join(output_dir, "daily_attack_forecast.csv"), index=False)
-fig1 = model.plot(forecast)
-fig1.savefig(os.path.join(output_dir, "daily_attack_forecast.png"))
-
-# Forecast number of each type of attack
-attack_types = df['Label'].unique()
-for attack in attack_types:
-    subset = df[df['Label'] == attack]
-    subset['Date'] = subset['Timestamp'].dt.date
-    type_attacks = subset.groupby('Date').size().reset_index(name='y')
-    type_attacks.rename(columns={'Date': 'ds'}, inplace=True)
-
-    if len(type_attacks) < 2:  # Prophet requires at least two data points
-        print(f"Skipping attack type '{attack}' due to insufficient data.")
-        continue
-
-    model_type = Prophet()
-    model_type.fit(type_attacks)
-    future_type = model_type.make_future_dataframe(periods=30)
-    forecast_type = model_type.predict(future_type)
-
-    forecast_type[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].to_csv(
-        os.path.join(output_dir, f"{attack}_forecast.csv"), index=False
-    )
-    fig2 = model_type.plot(forecast_type)
-    fig2.savefig(os.path.join(output_dir, f"{attack}_forecast.png"))
-
-if len(attack_types) == 0:
-    print("Warning: No attack types found in dataset.")
-
-print("Forecasts generated and saved in 'forecasts/' directory.")
\ No newline at end of file
+def fit_forecast(series, periods=FORECAST_PERIODS, init=None):
+    """Fits Prophet on a (ds, y) series and forecasts `periods` days ahead; returns (model, forecast).
+
+    `init` holds the parameters of an earlier fit to start the optimizer from. They no longer
+    fit when the number of changepoints or seasonalities changed, in which case the model is
+    fitted from scratch.
+    """
+    from prophet import Prophet
+
+    model = None
+    if init:
+        try:
+            model = Prophet()
+            model.fit(series, init={name: np.asarray(value) for name, value in init.items()})
+        except Exception:
+            model = None  # Shape changed since the last fit
+    if model is None:
+        model = Prophet()
+        model.fit(series)  # No `init` at all: Prophet rejects init=None
+    future = model.make_future_dataframe(periods=periods)
+    return model, model.predict(future)
+
+def forecast_label(label, series, periods=FORECAST_PERIODS, init=None):
+    """Forecast of one label alongside its observed counts, its fitted parameters and the fit time (runs in a worker)."""
+    start = time.perf_counter()
+    model, forecast = fit_forecast(series, periods, init)
+    fit_seconds = time.perf_counter() - start
+
+    observed = series.assign(ds=pd.to_datetime(series['ds']))
+    frame = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].merge(observed, on='ds', how='left')
+    frame.insert(0, 'label', label)
+    return frame, warm_start_params(model), fit_seconds
+
+def save_forecasts(forecasts, output_dir=output_dir):
+    """Writes the combined forecasts atomically, so readers never see a partial file."""
+    path = os.path.join(output_dir, FORECAST_FILE)
+    forecasts.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return path
+
+def _file_version(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def load_model_state(output_dir=output_dir):
+    """Per-label watermark and fitted parameters of the last Prophet run, and the version of the file it wrote."""
+    path = os.path.join(output_dir, MODEL_STATE_FILE)
+    if not os.path.exists(path):
+        return {}, None
+    with open(path) as f:
+        state = json.load(f)
+    if "store" not in state:  # Written before forecasts were tagged with their version: refit once
+        return {}, None
+    return state["labels"], state["store"]
+
+def _cached_forecasts(output_dir, store):
+    """Forecasts per label from the last Prophet run, unless another backend has since replaced them."""
+    path = os.path.join(output_dir, FORECAST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb") as f:
+        data = f.read()
+    if _file_version(data) != store:
+        return {}
+    return dict(tuple(pd.read_parquet(io.BytesIO(data)).groupby('label', sort=False)))
+
+def run_forecasts(path=input_file, output_dir=output_dir, periods=FORECAST_PERIODS, workers=None, plot=False,
+                  force=False):
+    """Forecasts the total number of attacks per day and the number of each attack type.
+
+    Daily counts come from the persisted count cube, which only reads the rows added since
+    the last run. Each label's forecast is cached with the watermark of the series it was
+    fitted on. Labels whose series did not change keep their cached forecast, and the others
+    are refitted in a process pool, warm-started from their previous parameters. The forecasts
+    are written to a single Parquet file, and per-label fit times to a run summary. A label
+    whose fit fails is recorded in the summary and does not stop the others. PNG plots are an
+    optional separate stage (`plot_forecasts`) that reads the combined file.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    series = daily_series(update_cube(path))
+    print(f"Number of unique dates: {len(series[TOTAL_LABEL])}")
+    if len(series[TOTAL_LABEL]) < 2:
+        raise ValueError("Not enough data for time series forecasting. Ensure the dataset spans multiple dates.")
+    if len(series) == 1:
+        print("Warning: No attack types found in dataset.")
+
+    # 🔹 Prophet requires at least two data points per series
+    skipped = [label for label, counts in series.items() if len(counts) < 2]
+    for label in skipped:
+        print(f"Skipping attack type '{label}' due to insufficient data.")
+
+    # 🔹 Reuse the forecasts of labels whose data has not changed since their last fit
+    state, store = load_model_state(output_dir)
+    cached = _cached_forecasts(output_dir, store)
+    keys = {label: series_key(counts, periods) for label, counts in series.items() if label not in skipped}
+    stale = [label for label, key in keys.items()
+             if force or label not in cached or state.get(label, {}).get("key") != key]
+    if not stale and set(cached) == set(keys):
+        print("✅ Forecasts are up to date, nothing to refit")
+        forecasts = pd.concat(cached.values(), ignore_index=True)
+        if plot:
+            plot_forecasts(forecasts, output_dir)
+        return forecasts
+
+    # 🔹 Refit the stale labels in parallel, largest series first
+    start = time.perf_counter()
+    frames = [cached[label] for label in keys if label not in stale]
+    timings = [{"label": label, "days": len(series[label]), "fit_seconds": 0.0, "status": "cached"}
+               for label in keys if label not in stale]
+    new_state = {label: state[label] for label in keys if label not in stale}
+    stale.sort(key=lambda label: -len(series[label]))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(forecast_label, label, series[label], periods, state.get(label, {}).get("params")): label
+                   for label in stale}
+        for future in as_completed(futures):
+            label = futures[future]
+            timing = {"label": label, "days": len(series[label]), "warm_start": label in state}
+            try:
+                frame, params, timing["fit_seconds"] = future.result()
+                frames.append(frame)
+                new_state[label] = {"key": keys[label], "last_ds": str(series[label]['ds'].max()), "params": params}
+                timing["status"] = "fitted"
+            except Exception as e:
+                timing.update(status="failed", error=f"{type(e).__name__}: {e}")
+                print(f"⚠️ Forecast for '{label}' failed: {timing['error']}")
+                if label in cached:  # Keep serving the last forecast; it is retried on the next run
+                    frames.append(cached[label])
+                    if label in state:
+                        new_state[label] = state[label]
+            timings.append(timing)
+    wall_seconds = time.perf_counter() - start
+    if not frames:
+        raise RuntimeError("❌ Every forecast failed, nothing saved")
+
+    forecasts = pd.concat(frames, ignore_index=True).sort_values(['label', 'ds'], ignore_index=True)
+    store = save_forecasts(forecasts, output_dir)
+    with open(store, "rb") as f:
+        version = _file_version(f.read())
+    state_path = os.path.join(output_dir, MODEL_STATE_FILE)
+    with open(state_path + ".tmp", "w") as f:
+        json.dump({"store": version, "labels": new_state}, f)
+    os.replace(state_path + ".tmp", state_path)
+
+    # 🔹 Run summary with per-label timing
+    table = pd.DataFrame(timings).sort_values('fit_seconds', ascending=False, na_position='last')
+    fit_total = float(table['fit_seconds'].sum())
+    summary = {
+        "backend": "prophet",
+        "generated_at": datetime.datetime.now().isoformat(),
+        "input": os.path.abspath(path),
+        "periods": periods,
+        "wall_seconds": wall_seconds,
+        "fit_seconds_total": fit_total,
+        "fitted": len(stale),
+        "cached": len(keys) - len(stale),
+        "labels": table.to_dict(orient="records"),
+        "skipped": skipped,
+    }
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+
+    print("📌 Per-label fit times:")
+    print(table.round({"fit_seconds": 2}).to_string(index=False))
+    print(f"📌 {len(stale)} labels refitted, {len(keys) - len(stale)} cached, in {wall_seconds:.1f}s wall time "
+          f"({fit_total:.1f}s of fitting)")
+    print(f"✅ Forecasts saved to: {store}")
+
+    if plot:
+        plot_forecasts(forecasts, output_dir)
+    return forecasts
+
+def run_holt_winters(path=input_file, output_dir=output_dir, periods=FORECAST_PERIODS, freq="D", season=None,
+                     plot=False):
+    """Forecasts every label at once with the vectorized Holt-Winters backend.
+
+    Counts per `freq` bucket (no finer than the count cube's) are forecast `periods` buckets
+    ahead. The output has the same layout as the Prophet backend's and replaces it in the
+    forecast file, so the forecast endpoint serves whichever backend ran last.
+    """
+    from src.holt_winters import forecast_matrix, season_length
+
+    os.makedirs(output_dir, exist_ok=True)
+    matrix = update_cube(path).matrix(freq)
+    if len(matrix) < 2:
+        raise ValueError("Not enough data for time series forecasting. Ensure the dataset spans multiple buckets.")
+    matrix[TOTAL_LABEL] = matrix.sum(axis=1)
+
+    start = time.perf_counter()
+    forecasts, table = forecast_matrix(matrix, periods, freq, season)
+    seconds = time.perf_counter() - start
+    store = save_forecasts(forecasts, output_dir)
+
+    summary = {
+        "backend": "holt-winters",
+        "generated_at": datetime.datetime.now().isoformat(),
+        "input": os.path.abspath(path),
+        "freq": freq,
+        "season": season_length(freq) if season is None else season,
+        "buckets": len(matrix),
+        "periods": periods,
+        "wall_seconds": seconds,
+        "labels": table.to_dict(orient="records"),
+    }
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+
+    print("📌 Holt-Winters parameters per label:")
+    print(table.round(3).to_string(index=False))
+    print(f"📌 {len(table)} labels × {len(matrix)} '{freq}' buckets forecast {periods} ahead in {seconds * 1000:.1f} ms")
+    print(f"✅ Forecasts saved to: {store}")
+
+    if plot:
+        plot_forecasts(forecasts, output_dir)
+    return forecasts
+
+def _plot_name(label):
+    if label == TOTAL_LABEL:
+        return "daily_attack_forecast.png"
+    return re.sub(r"[^\w.-]+", "_", str(label)).strip("_") + "_forecast.png"
+
+def plot_forecasts(forecasts=None, output_dir=output_dir):
+    """Renders one PNG per label, headless, from the combined forecast file."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    if forecasts is None:
+        forecasts = read_table(os.path.join(output_dir, FORECAST_FILE))
+    for label, frame in forecasts.groupby('label', sort=False):
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.plot(frame['ds'], frame['y'], 'k.', label='Observed')
+        ax.plot(frame['ds'], frame['yhat'], color='#0072B2', label='Forecast')
+        ax.fill_between(frame['ds'], frame['yhat_lower'], frame['yhat_upper'], color='#0072B2', alpha=0.2)
+        ax.set_title(label)
+        ax.set_xlabel('ds')
+        ax.set_ylabel('y')
+        ax.legend()
+        fig.savefig(os.path.join(output_dir, _plot_name(label)))
+        plt.close(fig)
+    print(f"✅ {forecasts['label'].nunique()} plots saved in '{output_dir}'")
+
+# 📌 Forecast serving: the forecast file is parsed off the request path, on load and when it changes
+class ForecastSnapshot:
+    """One version of the forecast file, split per label and pre-serialized for responses."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:  # Signature, hash and contents all come from the same file
+            stat = os.fstat(f.fileno())
+            data = f.read()
+        self.signature = (stat.st_size, stat.st_mtime_ns)
+        self.version = _file_version(data)
+        self.loaded_at = datetime.datetime.now().isoformat()
+        forecasts = pd.read_parquet(io.BytesIO(data))
+        daily = (forecasts['ds'] == forecasts['ds'].dt.normalize()).all()
+        forecasts['ds'] = forecasts['ds'].dt.strftime('%Y-%m-%d' if daily else '%Y-%m-%dT%H:%M:%S')
+        forecasts = forecasts.astype(object).where(forecasts.notna(), None)
+
+        # Rows after a label's last observed day are its forecast; the rest its history
+        self.history, self.future = {}, {}
+        for label, frame in forecasts.groupby('label', sort=True):
+            records = frame.drop(columns='label').to_dict(orient='records')
+            observed = [i for i, row in enumerate(records) if row['y'] is not None]
+            split = observed[-1] + 1 if observed else 0
+            self.history[label], self.future[label] = records[:split], records[split:]
+        self.responses = {}
+
+    def response(self, labels, horizon, history):
+        """Encoded body and ETag for a query, built once per forecast version."""
+        key = (tuple(labels), horizon, history)
+        if key not in self.responses:
+            body = json.dumps({
+                "version": self.version,
+                "forecasts": {label: (self.history[label][-history:] if history else []) +
+                                     self.future[label][:horizon] for label in labels},
+            }).encode()
+            if len(self.responses) >= RESPONSE_CACHE_SIZE:
+                self.responses.clear()
+            etag = '"' + hashlib.sha256(f"{self.version}:{key}".encode()).hexdigest()[:16] + '"'
+            self.responses[key] = (body, etag)
+        return self.responses[key]
+
+class ForecastCache:
+    """Serves the latest forecast file from memory and swaps in new versions as the forecast job writes them."""
+
+    def __init__(self, path=None, interval=REFRESH_INTERVAL):
+        self.path = path or os.path.join(output_dir, FORECAST_FILE)
+        self.interval = interval
+        self.current = None
+        self.refreshes = 0
+        self.last_error = None
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def refresh(self):
+        """Loads the forecast file if it changed; the snapshot is swapped in with one assignment."""
+        signature = self._signature()
+        if signature is None or (self.current is not None and signature == self.current.signature):
+            return False
+        try:
+            snapshot = ForecastSnapshot(self.path)
+        except Exception as e:  # E.g. a file replaced mid-read; retried at the next check
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"⚠️ Keeping the loaded forecasts, new file failed to load: {self.last_error}")
+            return False
+        self.current, self.last_error = snapshot, None
+        self.refreshes += 1
+        print(f"✅ Loaded forecasts version {snapshot.version} ({len(snapshot.future)} labels)")
+        return True
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._signature() != (self.current.signature if self.current else None):
+                await run_in_threadpool(self.refresh)
+
+def _load_cache():
+    """A cache holding a loaded snapshot; fails (and is retried) while there is none to serve."""
+    cache = ForecastCache()
+    cache.refresh()
+    if cache.current is None:
+        raise FileNotFoundError(cache.last_error or f"No forecasts at {cache.path} yet, run python -m src.prediction")
+    return cache
+
+forecast_cache = LazyResource("forecasts", _load_cache)
+service = {}
+
+async def _start_serving():
+    """Loads the first forecasts, retrying until the forecast job has written some, then watches for new ones."""
+    while "cache" not in service:
+        try:
+            cache = await run_in_threadpool(forecast_cache.get)
+        except Exception:
+            print(f"⚠️ Forecasts failed to load: {forecast_cache.error}, retrying in {REFRESH_INTERVAL:g}s")
+            await asyncio.sleep(REFRESH_INTERVAL)
+            continue
+        service.update(cache=cache, watcher=asyncio.get_running_loop().create_task(cache.watch()))
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    starter = asyncio.get_running_loop().create_task(_start_serving())
+    yield
+    for task in (starter, service.get("watcher")):
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+    service.clear()
+
+# 📌 Forecast endpoints, mounted under /predict
+router = APIRouter(lifespan=lifespan)
+
+@router.get("/forecast")
+async def get_forecast(request: Request, label: Optional[List[str]] = Query(None),
+                       horizon: Optional[int] = Query(None, ge=1), history: int = Query(0, ge=0)):
+    """
+    Forecasts per attack type (and `ALL` for the total) from the latest forecast run, daily or
+    per Holt-Winters bucket. `label` may repeat to select several; `horizon` caps the buckets
+    ahead and `history` adds that many past buckets with their observed counts. Send the returned ETag as If-None-Match
+    to get 304 until new forecasts are published.
+    """
+    snapshot = service["cache"].current if "cache" in service else None
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="No forecasts loaded yet, run python -m src.prediction")
+
+    labels = sorted(set(label)) if label else list(snapshot.future)
+    unknown = [name for name in labels if name not in snapshot.future]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"No forecast for {unknown}")
+
+    body, etag = snapshot.response(labels, horizon, history)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/forecast/status")
+async def forecast_status():
+    """
+    Version and load time of the served forecasts, and the last refresh error.
+    """
+    cache = service.get("cache")
+    snapshot = cache.current if cache else None
+    return {
+        "version": snapshot.version if snapshot else None,
+        "loaded_at": snapshot.loaded_at if snapshot else None,
+        "labels": list(snapshot.future) if snapshot else [],
+        "refreshes": cache.refreshes if cache else 0,
+        "last_error": cache.last_error if cache else None,
+        "refresh_interval": REFRESH_INTERVAL,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Forecast attack counts per label with Prophet or Holt-Winters.")
+    parser.add_argument("--input", default=input_file, help="Dataset with Timestamp and Label columns")
+    parser.add_argument("--backend", choices=BACKENDS, default="prophet", help="Forecasting backend")
+    parser.add_argument("--periods", type=int, default=FORECAST_PERIODS, help="Buckets (days for Prophet) to forecast")
+    parser.add_argument("--freq", default="D", help="Holt-Winters bucket size (pandas frequency, e.g. D, h, min)")
+    parser.add_argument("--season", type=int, default=None, help="Holt-Winters buckets per season (default from --freq)")
+    parser.add_argument("--workers", type=int, default=None, help="Prophet fitting processes (defaults to all cores)")
+    parser.add_argument("--force", action="store_true", help="Refit every label, even if its data is unchanged")
+    parser.add_argument("--plot", action="store_true", help="Also render a PNG per label after forecasting")
+    parser.add_argument("--plot-only", action="store_true", help="Only render PNGs from the saved forecasts")
+    args = parser.parse_args()
+    if args.plot_only:
+        plot_forecasts()
+    elif args.backend == "holt-winters":
+        run_holt_winters(args.input, periods=args.periods, freq=args.freq, season=args.season, plot=args.plot)
+    else:
+        run_forecasts(args.input, periods=args.periods, workers=args.workers, plot=args.plot, force=args.force)
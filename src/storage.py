@@ -0,0 +1,110 @@
+import os
+import glob
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 📌 Intermediates are exchanged as Parquet, written in row groups so that readers
+# can stream them and load only the columns they need
+ROW_GROUP_SIZE = 250_000
+
+def read_table(path, columns=None):
+    """Reads a Parquet (memory-mapped) or CSV table, loading only the requested columns.
+
+    A folder is read as a partitioned Parquet dataset, and a Parquet file together with
+    the parts appended to it.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ File not found: {path}")
+
+    if path.endswith(".parquet") and appended_parts(path):
+        return pq.read_table(table_files(path), columns=columns, memory_map=True).to_pandas()
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    return pd.read_csv(path, usecols=columns, low_memory=False)
+
+def write_table(df, path):
+    """Writes a DataFrame as Parquet row groups (or CSV, based on the file extension)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path.endswith(".parquet"):
+        df.to_parquet(f"{path}.tmp", index=False, row_group_size=ROW_GROUP_SIZE)
+        os.replace(f"{path}.tmp", path)  # A new file, never written through a link to a cache entry
+        drop_parts(path)  # Rows appended to the previous table do not belong to this one
+    else:
+        df.to_csv(path, index=False)
+
+# 📌 Rows added to a Parquet table later go into numbered part files next to it, so an
+# append writes only the new rows and the original file stays as it was
+def parts_folder(path):
+    return path[:-len(".parquet")] + ".parts"
+
+def appended_parts(path):
+    """Part files appended to the Parquet table at `path`, oldest first."""
+    return sorted(glob.glob(os.path.join(parts_folder(path), "part-*.parquet")))
+
+def table_files(path):
+    return [path] + appended_parts(path)
+
+def next_part(path):
+    """Path for the next part of the table at `path`; write it elsewhere and move it there when complete."""
+    os.makedirs(parts_folder(path), exist_ok=True)
+    return os.path.join(parts_folder(path), f"part-{len(appended_parts(path)):05d}.parquet")
+
+def drop_parts(path):
+    shutil.rmtree(parts_folder(path), ignore_errors=True)
+
+class ParquetTable:
+    """A Parquet file and its appended parts, streamed like a single `pq.ParquetFile`.
+
+    Row groups are numbered across the files in order.
+    """
+
+    def __init__(self, path):
+        self.files = [pq.ParquetFile(file) for file in table_files(path)]
+        self.schema_arrow = self.files[0].schema_arrow
+        self.row_groups = [(file, i) for file in self.files for i in range(file.num_row_groups)]
+        self.num_row_groups = len(self.row_groups)
+        self.num_rows = sum(file.metadata.num_rows for file in self.files)
+
+    def row_group_rows(self, i):
+        file, j = self.row_groups[i]
+        return file.metadata.row_group(j).num_rows
+
+    def iter_batches(self, batch_size=65536, row_groups=None, columns=None):
+        selected = set(range(self.num_row_groups) if row_groups is None else row_groups)
+        for file in self.files:
+            groups = [j for i, (owner, j) in enumerate(self.row_groups) if owner is file and i in selected]
+            if groups:
+                yield from file.iter_batches(batch_size=batch_size, row_groups=groups, columns=columns)
+
+class TableWriter:
+    """Appends DataFrame chunks to a single Parquet or CSV file."""
+
+    def __init__(self, path, schema=None):
+        self.path = path
+        self.schema = schema  # Optional Arrow schema, for chunks whose inferred types may differ
+        self._parquet = None
+        self._chunks = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(self, df):
+        if self.path.endswith(".parquet"):
+            table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table, row_group_size=ROW_GROUP_SIZE)
+        else:
+            df.to_csv(self.path, mode="w" if self._chunks == 0 else "a", header=(self._chunks == 0), index=False)
+        self._chunks += 1
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,75 @@
+import os
+import time
+import threading
+
+# 📌 Heavy resources (models, NLP pipelines) are built on first use or by a background warm-up,
+# never at import, so API workers start quickly
+WARM_ON_STARTUP = os.environ.get("WARM_ON_STARTUP", "1") != "0"  # Build every subsystem right after startup
+
+# 📌 Every lazy resource, by name, for the readiness report
+SUBSYSTEMS = {}
+
+class LazyResource:
+    """A resource built once by `factory`, on first use or by a background warm-up.
+
+    The state moves from "cold" through "loading" to "ready", or to "failed" with the
+    error kept for the readiness report. A failed resource is retried on the next `get`.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.state = "cold"
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+        SUBSYSTEMS[name] = self
+
+    def get(self):
+        """The built resource; blocks while another thread is building it."""
+        if self.state == "ready":
+            return self.value
+        with self._lock:
+            if self.state == "ready":
+                return self.value
+            self.state = "loading"
+            start = time.perf_counter()
+            try:
+                self.value = self.factory()
+            except Exception as e:
+                self.state = "failed"
+                self.error = f"{type(e).__name__}: {e}"
+                raise
+            self.load_seconds = time.perf_counter() - start
+            self.state, self.error = "ready", None
+            print(f"✅ {self.name} loaded in {self.load_seconds:.2f}s")
+        return self.value
+
+    def warm(self):
+        """Starts building the resource on a background thread and returns immediately."""
+        if self.state in ("cold", "failed"):
+            threading.Thread(target=self._warm, name=f"warm-{self.name}", daemon=True).start()
+
+    def _warm(self):
+        try:
+            self.get()
+        except Exception:
+            print(f"⚠️ {self.name} failed to load: {self.error}")
+
+    def reset(self):
+        """Forgets a broken resource so that it is built again on the next warm-up."""
+        with self._lock:
+            self.state, self.value = "cold", None
+
+    def status(self):
+        return {"state": self.state, "load_seconds": self.load_seconds, "error": self.error}
+
+def warm_all():
+    for resource in SUBSYSTEMS.values():
+        resource.warm()
+
+def readiness():
+    """Whether every subsystem is ready, and the status of each one."""
+    states = {name: resource.status() for name, resource in SUBSYSTEMS.items()}
+    return all(state["state"] == "ready" for state in states.values()), states
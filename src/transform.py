@@ -0,0 +1,207 @@
+import os
+import copy
+import datetime
+import joblib
+import numpy as np
+import pandas as pd
+from src.window_features import (host_window_features, raw_window_inputs, window_feature_names,
+                                  HOST_COLUMN, TIME_COLUMN, PORT_COLUMN, BYTE_COLUMNS, PACKET_COLUMNS)
+
+# 📌 The fitted transform lives next to the classifier it feeds
+MODEL_DIR = os.path.join(os.path.dirname(__file__), "../models")
+TRANSFORM_PATH = os.path.join(MODEL_DIR, "preprocessing_transform.pkl")
+STAGED_TRANSFORM_PATH = os.path.join(MODEL_DIR, "preprocessing_transform.staged.pkl")  # Appended data, no model yet
+
+TRANSFORM_VERSION = 2  # Bump whenever the stored fields or their meaning change
+
+class PreprocessingTransform:
+    """Fitted preprocessing and feature-engineering state, replayable on raw flow batches."""
+
+    def __init__(self):
+        self.version = TRANSFORM_VERSION
+        self.fitted_at = None
+
+        # 🔹 Cleaning stage (data_preprocessing)
+        self.clean_num_cols = []
+        self.clean_mean = None
+        self.clean_scale = None
+        self.categories = {}  # Column -> sorted vocabulary, codes match LabelEncoder
+
+        # 🔹 Feature stage (feature_engineering)
+        self.drop_cols = []
+        self.engineered_features = {}  # Name -> (numerator, denominator)
+        self.host_windows = ()  # Window lengths (seconds) of the per-host aggregates
+        self.feature_num_cols = []  # Columns scaled by the feature stage (the rest pass through)
+        self.feature_mean = None
+        self.feature_scale = None
+        self.feature_columns = []  # Classifier input columns, in training order
+
+    def set_cleaning(self, num_cols, scaler, categories):
+        """Records the scaler and encoders fitted by the preprocessing stage."""
+        self.clean_num_cols = list(num_cols)
+        self.clean_mean = np.asarray(scaler.mean_, dtype=np.float64) if len(num_cols) else np.empty(0)
+        self.clean_scale = np.asarray(scaler.scale_, dtype=np.float64) if len(num_cols) else np.empty(0)
+        self.categories = {col: list(values) for col, values in categories.items()}
+
+    def set_features(self, drop_cols, engineered_features, num_cols, scaler, feature_columns, host_windows=()):
+        """Records the engineered feature definitions and the scaler fitted on them.
+
+        Vocabularies of the dropped identifier columns were only needed to engineer the
+        training set; they grow with every distinct flow and are not kept.
+        """
+        self.drop_cols = list(drop_cols)
+        self.categories = {col: vocab for col, vocab in self.categories.items() if col not in self.drop_cols}
+        self.engineered_features = dict(engineered_features)
+        self.host_windows = tuple(host_windows)
+        self.feature_num_cols = list(num_cols)
+        self.feature_mean = np.asarray(scaler.mean_, dtype=np.float64) if len(num_cols) else np.empty(0)
+        self.feature_scale = np.asarray(scaler.scale_, dtype=np.float64) if len(num_cols) else np.empty(0)
+        self.feature_columns = list(feature_columns)
+
+    def reduced(self, feature_columns):
+        """Returns a copy that computes only `feature_columns`, in that order.
+
+        Cleaned columns, categorical encodings, engineered ratios and host windows that no
+        selected feature depends on are dropped, so they are neither read nor computed.
+        """
+        feature_columns = list(feature_columns)
+        needed = set(feature_columns)
+        engineered = {name: inputs for name, inputs in self.engineered_features.items() if name in needed}
+        for inputs in engineered.values():
+            needed.update(inputs)
+        clean = [i for i, col in enumerate(self.clean_num_cols) if col in needed]
+        scaled = [i for i, col in enumerate(self.feature_num_cols) if col in needed]
+
+        reduced = copy.deepcopy(self)
+        reduced.clean_num_cols = [self.clean_num_cols[i] for i in clean]
+        reduced.clean_mean, reduced.clean_scale = self.clean_mean[clean], self.clean_scale[clean]
+        reduced.categories = {col: list(vocab) for col, vocab in self.categories.items() if col in needed}
+        reduced.engineered_features = engineered
+        reduced.host_windows = tuple(w for w in self.host_windows if needed & set(window_feature_names((w,))))
+        reduced.feature_num_cols = [self.feature_num_cols[i] for i in scaled]
+        reduced.feature_mean, reduced.feature_scale = self.feature_mean[scaled], self.feature_scale[scaled]
+        reduced.feature_columns = feature_columns
+        return reduced
+
+    def raw_columns(self):
+        """Raw flow columns that `transform` reads."""
+        columns = list(self.clean_num_cols) + list(self.categories)
+        if self.host_windows:
+            columns += [HOST_COLUMN, TIME_COLUMN, PORT_COLUMN, *BYTE_COLUMNS, *PACKET_COLUMNS]
+        return list(dict.fromkeys(columns))
+
+    def _cleaned_columns(self, batch):
+        """Applies the cleaning stage, returning one float32 array per cleaned column."""
+        n = len(batch)
+        columns = {}
+
+        # 🔹 Standardize all cleaned numeric columns in one vectorized step
+        if self.clean_num_cols:
+            raw = batch.reindex(columns=self.clean_num_cols)
+            values = raw.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+            values = ((values - self.clean_mean) / self.clean_scale).astype(np.float32)  # As stored by preprocessing
+            for i, col in enumerate(self.clean_num_cols):
+                columns[col] = values[:, i]
+
+        # 🔹 Encode categorical columns with the training vocabularies (unseen -> -1)
+        for col, vocab in self.categories.items():
+            if col in self.drop_cols:  # Artifacts saved before dropped vocabularies were pruned
+                continue
+            if col in batch.columns:
+                columns[col] = pd.Categorical(batch[col].astype(str), categories=vocab).codes.astype(np.float32)
+            else:
+                columns[col] = np.full(n, -1.0, dtype=np.float32)
+        return columns
+
+    def _engineered_columns(self, batch, hosts=None):
+        """Applies cleaning, per-host aggregates and engineered features to a raw batch.
+
+        Per-host aggregates see the flows inside `batch` plus, when a `HostWindowState` is
+        given as `hosts`, the earlier flows of the same hosts it has recorded.
+        """
+        columns = self._cleaned_columns(batch)
+        if self.host_windows:
+            inputs = raw_window_inputs(batch)
+            if hosts is not None:
+                columns.update(hosts.features(*inputs, self.host_windows))
+            else:
+                columns.update(host_window_features(*inputs, self.host_windows))
+        return self._add_engineered(columns)
+
+    def _add_engineered(self, columns):
+        for name, (numerator, denominator) in self.engineered_features.items():
+            columns[name] = columns[numerator] / (columns[denominator] + 1)
+        return columns
+
+    def _scaled_matrix(self, columns, names, n):
+        """Stacks the named columns, applying the feature-stage scaler to the columns it was fitted on."""
+        X = np.column_stack([columns[col] for col in names]) if n else np.empty((0, len(names)), dtype=np.float32)
+        index = {col: i for i, col in enumerate(self.feature_num_cols)}
+        targets = [i for i, col in enumerate(names) if col in index]
+        if targets:
+            positions = [index[names[i]] for i in targets]
+            X[:, targets] = (X[:, targets] - self.feature_mean[positions]) / self.feature_scale[positions]
+        return X
+
+    def transform(self, batch, hosts=None):
+        """Transforms a DataFrame of raw flows into the classifier's float32 feature matrix.
+
+        Columns missing from the batch (e.g. `Label` at serving time) are treated as
+        unknown values, and missing numeric values are imputed with the training mean.
+        Pass the stream's `HostWindowState` as `hosts` when flows arrive in small batches.
+        """
+        if not self.feature_columns:
+            raise ValueError("❌ Transform has not been fitted by feature engineering yet")
+
+        columns = self._engineered_columns(batch, hosts)
+        X = self._scaled_matrix(columns, self.feature_columns, len(batch))
+        return np.nan_to_num(X, nan=0.0).astype(np.float32)
+
+    def engineer(self, batch, names, hosts=None):
+        """Returns the rows of `batch` as feature engineering would store them, for the named columns."""
+        columns = self._engineered_columns(batch, hosts)
+        X = self._scaled_matrix(columns, names, len(batch))
+        return pd.DataFrame(X.astype(np.float32), columns=names, index=batch.index)
+
+    def save(self, path=TRANSFORM_PATH):
+        """Saves the transform as a single versioned artifact."""
+        self.fitted_at = datetime.datetime.now().isoformat()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        joblib.dump(self, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)  # Serving processes never see a partial artifact
+        return path
+
+    @classmethod
+    def load(cls, path=TRANSFORM_PATH):
+        """Loads a saved transform, rejecting artifacts written by an incompatible version."""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"❌ Transform artifact not found: {path}")
+        transform = joblib.load(path)
+        if getattr(transform, "version", None) != TRANSFORM_VERSION:
+            raise ValueError(f"❌ Transform artifact version {getattr(transform, 'version', None)} "
+                             f"is not supported (expected {TRANSFORM_VERSION}), re-run preprocessing")
+        return transform
+
+def training_transform_path():
+    """The transform the engineered dataset on disk was produced with.
+
+    Appending rows (src.incremental) stages an updated transform instead of replacing the one
+    being served, which belongs to the model trained with it.
+    """
+    return STAGED_TRANSFORM_PATH if os.path.exists(STAGED_TRANSFORM_PATH) else TRANSFORM_PATH
+
+def load_training_transform():
+    """Loads the transform of the engineered dataset on disk, None before preprocessing has run."""
+    path = training_transform_path()
+    return PreprocessingTransform.load(path) if os.path.exists(path) else None
+
+def promote_staged_transform():
+    """Serves the staged transform once a model has been retrained on the data it matches."""
+    if os.path.exists(STAGED_TRANSFORM_PATH):
+        os.replace(STAGED_TRANSFORM_PATH, TRANSFORM_PATH)
+        print(f"✅ Promoted the staged preprocessing transform to: {TRANSFORM_PATH}")
+
+def drop_staged_transform():
+    """Discards the staged transform once a full run has refitted the history it was staged for."""
+    if os.path.exists(STAGED_TRANSFORM_PATH):
+        os.remove(STAGED_TRANSFORM_PATH)
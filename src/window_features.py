@@ -0,0 +1,160 @@
+import threading
+import numpy as np
+import pandas as pd
+from src.ingestion import TIMESTAMP_FORMAT
+
+# 📌 Trailing window lengths (seconds) for the per-host aggregates
+HOST_WINDOWS = (10, 60, 300)
+
+# 📌 Raw columns the aggregates are computed from
+HOST_COLUMN = "Src IP"
+TIME_COLUMN = "Timestamp"
+PORT_COLUMN = "Dst Port"
+BYTE_COLUMNS = ("TotLen Fwd Pkts", "TotLen Bwd Pkts")
+PACKET_COLUMNS = ("Tot Fwd Pkts", "Tot Bwd Pkts")
+
+# 📌 Serving-time host history (HostWindowState)
+MAX_HOST_FLOWS = 10_000  # Recent flows kept per host; a flooding host's aggregates saturate there
+SWEEP_FLOWS = 100_000  # Flows added between sweeps of the hosts that went quiet
+
+def window_feature_names(windows=HOST_WINDOWS):
+    """Returns the names of the aggregate columns, in the order they are appended."""
+    names = []
+    for w in windows:
+        names += [f"Host Flows {w}s", f"Host Dst Ports {w}s", f"Host Byts/s {w}s", f"Host Pkts/s {w}s"]
+    return names
+
+def parse_seconds(values):
+    """Parses CICFlowMeter timestamps into epoch seconds, NaN where unparseable."""
+    timestamps = pd.to_datetime(pd.Series(values), format=TIMESTAMP_FORMAT, errors="coerce")
+    seconds = timestamps.to_numpy().astype("datetime64[s]").astype(np.int64)
+    return np.where(timestamps.isna().to_numpy(), np.nan, seconds.astype(np.float64))
+
+def host_window_features(hosts, seconds, ports, byts, pkts, windows=HOST_WINDOWS):
+    """Computes per-source-host aggregates over trailing time windows.
+
+    For every flow and window `w`, the aggregates cover the flows of the same host with a
+    timestamp in (t - w, t] that precede it in (host, time) order: flow count, distinct
+    destination ports, and byte and packet rates. Rows are sorted once and every window is
+    answered with vectorized searches and prefix sums. Flows without a valid timestamp get 0.
+    """
+    n = len(seconds)
+    seconds = np.asarray(seconds, dtype=np.float64)
+    features = {name: np.zeros(n, dtype=np.float32) for name in window_feature_names(windows)}
+    rows = np.flatnonzero(~np.isnan(seconds))
+    if not len(rows):
+        return features
+
+    # 🔹 Sort once by (host, time) and build a single monotone search key
+    host_codes = pd.factorize(np.asarray(hosts)[rows])[0].astype(np.int64)
+    t = (seconds[rows] - seconds[rows].min()).astype(np.int64)
+    order = np.lexsort((t, host_codes))
+    rows, host_codes, t = rows[order], host_codes[order], t[order]
+    span = int(t.max()) + max(windows) + 1  # Keeps the key ranges of different hosts apart
+    key = host_codes * span + t
+    pos = np.arange(len(rows))
+
+    # 🔹 Previous flow from the same host to the same destination port
+    port_codes = pd.factorize(np.asarray(ports)[rows])[0]
+    by_pair = np.lexsort((pos, port_codes, host_codes))
+    same_pair = (host_codes[by_pair][1:] == host_codes[by_pair][:-1]) & \
+                (port_codes[by_pair][1:] == port_codes[by_pair][:-1])
+    prev = np.full(len(rows), -1)
+    prev[by_pair[1:][same_pair]] = by_pair[:-1][same_pair]
+
+    byte_sums = np.concatenate([[0.0], np.cumsum(np.nan_to_num(np.asarray(byts, dtype=np.float64)[rows]))])
+    packet_sums = np.concatenate([[0.0], np.cumsum(np.nan_to_num(np.asarray(pkts, dtype=np.float64)[rows]))])
+
+    for w in windows:
+        start = np.searchsorted(key, key - w, side="right")  # First flow inside each window
+        count = pos - start + 1
+
+        # Flow j repeats a port for every window that still contains prev[j]. `start` is
+        # non-decreasing, so those windows are the ones ending at j .. end[j] - 1.
+        repeat = prev >= 0
+        end = np.searchsorted(start, prev[repeat], side="right")
+        j = pos[repeat]
+        live = end > j
+        diff = np.bincount(j[live], minlength=len(rows) + 1) - np.bincount(end[live], minlength=len(rows) + 1)
+        distinct = count - np.cumsum(diff)[:-1]
+
+        features[f"Host Flows {w}s"][rows] = count
+        features[f"Host Dst Ports {w}s"][rows] = distinct
+        features[f"Host Byts/s {w}s"][rows] = (byte_sums[pos + 1] - byte_sums[start]) / w
+        features[f"Host Pkts/s {w}s"][rows] = (packet_sums[pos + 1] - packet_sums[start]) / w
+    return features
+
+def raw_window_inputs(frame):
+    """Extracts the aggregate inputs from a DataFrame of raw (string or numeric) flows."""
+    def numeric(col):
+        if col not in frame.columns:
+            return np.zeros(len(frame))
+        return pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype=np.float64)
+
+    hosts = frame[HOST_COLUMN].astype(str).to_numpy() if HOST_COLUMN in frame.columns else np.zeros(len(frame))
+    seconds = parse_seconds(frame[TIME_COLUMN]) if TIME_COLUMN in frame.columns else np.full(len(frame), np.nan)
+    ports = numeric(PORT_COLUMN)
+    byts = sum(np.nan_to_num(numeric(col)) for col in BYTE_COLUMNS)
+    pkts = sum(np.nan_to_num(numeric(col)) for col in PACKET_COLUMNS)
+    return hosts, seconds, ports, byts, pkts
+
+class HostWindowState:
+    """Recent flows of every source host, so that aggregates computed on small batches see each host's history.
+
+    Training aggregates the whole dataset at once, while a request carries a handful of
+    flows. Each host keeps its flows from the last `retention` seconds before the newest
+    timestamp seen, up to the latest `MAX_HOST_FLOWS`, so a request costs at most that many
+    rows per host. A batch is aggregated together with the history of its hosts and then
+    added to it. Safe to share between threads.
+    """
+
+    def __init__(self, retention=max(HOST_WINDOWS)):
+        self.retention = retention
+        self.flows = {}  # Host -> (seconds, ports, byts, pkts) of its recent flows
+        self.latest = -np.inf
+        self._added = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _lock=threading.Lock())
+
+    def features(self, hosts, seconds, ports, byts, pkts, windows=HOST_WINDOWS):
+        """`host_window_features` of the batch, with each host's earlier flows inside its windows."""
+        hosts = np.asarray(hosts, dtype=object)
+        batch = [np.asarray(values, dtype=np.float64) for values in (seconds, ports, byts, pkts)]
+        groups = pd.Series(np.arange(len(hosts))).groupby(hosts, sort=False).indices
+        with self._lock:
+            known = [host for host in groups if host in self.flows]
+            past_hosts = np.repeat(np.array(known, dtype=object), [len(self.flows[host][0]) for host in known])
+            past = [np.concatenate([self.flows[host][i] for host in known] + [np.empty(0)]) for i in range(4)]
+            features = host_window_features(np.concatenate([past_hosts, hosts]),
+                                            *(np.concatenate(pair) for pair in zip(past, batch)), windows)
+            self._remember(groups, batch)
+        return {name: values[len(past_hosts):] for name, values in features.items()}
+
+    def _remember(self, groups, batch):
+        valid = ~np.isnan(batch[0])
+        if valid.any():
+            self.latest = max(self.latest, batch[0][valid].max())
+        cutoff = self.latest - self.retention
+        for host, rows in groups.items():
+            rows = rows[valid[rows]]
+            columns = [values[rows] for values in batch]
+            if host in self.flows:
+                columns = [np.concatenate(pair) for pair in zip(self.flows[host], columns)]
+            keep = columns[0] > cutoff
+            if keep.any():
+                self.flows[host] = tuple(values[keep][-MAX_HOST_FLOWS:] for values in columns)
+            else:
+                self.flows.pop(host, None)
+
+        # 🔹 Hosts only expire when they send again, so drop the quiet ones once in a while
+        self._added += len(batch[0])
+        if self._added >= SWEEP_FLOWS:
+            self._added = 0
+            self.flows = {host: columns for host, columns in self.flows.items() if columns[0].max() > cutoff}